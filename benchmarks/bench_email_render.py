@@ -0,0 +1,107 @@
+"""
+Micro-benchmark of the suggestion email renderer.
+
+Compares lambda/shared/email_render.py with the dict_to_html_table function it
+replaced, for single emails and for a batch of recipients sharing restaurants.
+
+The recipients of a batch draw their suggestions from a pool of --pool
+restaurants; LF2 groups recipients by preference, so a smaller pool is closer
+to a batch of one group.
+
+Usage:
+    python benchmarks/bench_email_render.py [--number 2000] [--batch 10] [--pool 50]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda', 'shared'))
+
+from email_render import EMAIL_COLUMNS, render_batch, render_suggestions  # noqa: E402
+
+
+def legacy_reorder_dict(d, key_order):
+    return {key: d[key] for key in key_order if key in d}
+
+
+def legacy_dict_to_html_table(data, cuisine_type, location):
+    """The renderer previously duplicated in LF1 and LF2 utils.py."""
+    html_table = f"""<html>
+            <head></head>
+            <body>
+            <h1> Here is your suggestions for {cuisine_type.title()} restaurants in {location}</h1>.
+            <table border='1'>"""
+
+    html_table += "<tr>"
+    for key in data[0].keys():
+        html_table += f"<th>{key.title()}</th>"
+    html_table += "</tr>"
+
+    for item in data:
+        html_table += "<tr>"
+        for key, value in item.items():
+            html_table += f"<td>{str(value).title()}</td>"
+        html_table += "</tr>"
+
+    html_table += """</table>
+        <br><br>
+        <p> Hope you like the suggestions.
+                </body>
+            </html>"""
+
+    return html_table
+
+
+def make_restaurants(count):
+    return [
+        {
+            'business_id': f"id-{index}",
+            'name': f"Trattoria Number {index} & Sons",
+            'address': f"{index} Mulberry St, New York, NY 10013",
+            'rating': round(random.uniform(2.5, 5.0), 1),
+            'review_count': random.randint(1, 2000),
+        }
+        for index in range(count)
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Email renderer micro-benchmark")
+    parser.add_argument('--number', type=int, default=2000, help='Iterations per measurement')
+    parser.add_argument('--batch', type=int, default=10, help='Recipients per batch')
+    parser.add_argument('--pool', type=int, default=50, help='Restaurants the recipients of a batch draw from')
+    args = parser.parse_args(argv)
+
+    pool = make_restaurants(max(args.pool, 5))
+    suggestions = pool[:5]
+    batch = []
+    for _ in range(args.batch):
+        restaurants = random.sample(pool, 5)
+        batch.append((restaurants, {'Cuisine': 'italian', 'Location': 'Manhattan'},
+                      [restaurant['business_id'] for restaurant in restaurants]))
+
+    def legacy_single():
+        legacy_dict_to_html_table([legacy_reorder_dict(r, EMAIL_COLUMNS) for r in suggestions], 'italian', 'Manhattan')
+
+    def engine_single():
+        render_suggestions(suggestions, 'italian', 'Manhattan')
+
+    def legacy_batch():
+        for restaurants, details, _ in batch:
+            legacy_dict_to_html_table([legacy_reorder_dict(r, EMAIL_COLUMNS) for r in restaurants],
+                                      details['Cuisine'], details['Location'])
+
+    def engine_batch():
+        render_batch(batch)
+
+    print(f"{'case':<28}{'us/op':>10}")
+    for name, func in [('legacy single (html)', legacy_single), ('engine single (html+text)', engine_single),
+                       (f'legacy batch of {args.batch}', legacy_batch), (f'engine batch of {args.batch}', engine_batch)]:
+        seconds = min(timeit.repeat(func, number=args.number, repeat=5))
+        print(f"{name:<28}{seconds / args.number * 1e6:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Micro-benchmark of the LF2 geo index.
+
+Builds snapshots of synthetic restaurants spread over Manhattan and times
+nearest and radius queries for each catalog size, next to a linear scan.
+
+Usage:
+    python benchmarks/bench_geo_index.py [--sizes 10000 100000] [--queries 2000]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda')
+sys.path[:0] = [os.path.join(ROOT, 'shared'), os.path.join(ROOT, 'LF2 Worker')]
+
+from geo_index import KM_PER_DEGREE, GeoIndex, write_geo_index  # noqa: E402
+
+CUISINES = ['Italian', 'Indian', 'French', 'Chinese', 'Mexican', 'Thai', 'Japanese']
+
+# Roughly the bounding box of Manhattan
+SOUTH, NORTH = 40.70, 40.88
+WEST, EAST = -74.02, -73.91
+
+
+def make_restaurants(count, rng):
+    return [
+        (rng.choice(CUISINES), f"id-{index}", rng.uniform(SOUTH, NORTH), rng.uniform(WEST, EAST),
+         f"10{rng.randint(1, 282):03d}")
+        for index in range(count)
+    ]
+
+
+def linear_nearest(restaurants, cuisine, latitude, longitude, k):
+    """The scan the index replaces: every restaurant of the cuisine, sorted by distance."""
+    scale = math.cos(math.radians(latitude))
+    distances = sorted(
+        (math.hypot(lat - latitude, (lon - longitude) * scale) * KM_PER_DEGREE, business_id)
+        for title, business_id, lat, lon, _ in restaurants if title == cuisine
+    )
+    return distances[:k]
+
+
+def time_per_call(func, points):
+    started = time.perf_counter()
+    for point in points:
+        func(*point)
+    return (time.perf_counter() - started) / len(points) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--radius-km', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    print(f"{'restaurants':>12}{'load ms':>10}{'nearest ms':>12}{'nearest 100 ms':>16}"
+          f"{'radius ms':>11}{'scan ms':>10}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            restaurants = make_restaurants(size, rng)
+            path = os.path.join(workdir, f"geo-{size}.json.gz")
+            write_geo_index(restaurants, path)
+
+            started = time.perf_counter()
+            index = GeoIndex(path)
+            load_ms = (time.perf_counter() - started) * 1000
+
+            points = [(rng.choice(CUISINES), rng.uniform(SOUTH, NORTH), rng.uniform(WEST, EAST))
+                      for _ in range(args.queries)]
+            nearest_ms = time_per_call(lambda c, lat, lon: index.nearest(c, lat, lon, args.k, 3), points)
+            pool_ms = time_per_call(lambda c, lat, lon: index.nearest(c, lat, lon, 100, 3), points)
+            radius_ms = time_per_call(lambda c, lat, lon: index.within(c, lat, lon, args.radius_km), points)
+            scan_ms = time_per_call(
+                lambda c, lat, lon: linear_nearest(restaurants, c, lat, lon, args.k),
+                points[:max(1, args.queries // 100)]
+            )
+
+            print(f"{size:>12}{load_ms:>10.1f}{nearest_ms:>12.4f}{pool_ms:>16.4f}{radius_ms:>11.4f}{scan_ms:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
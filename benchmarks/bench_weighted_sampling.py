@@ -0,0 +1,103 @@
+"""
+Micro-benchmark of the LF2 weighted suggestion sampler.
+
+Draws k distinct restaurants from a pool of synthetic ratings with the alias
+table in lambda/LF2 Worker/weighted_sampling.py, and with the naive weighted
+approaches it replaces, which are O(n) per draw.
+
+Usage:
+    python benchmarks/bench_weighted_sampling.py [--pool-size 100000] [--k 5] [--draws 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda', 'LF2 Worker'))
+
+from weighted_sampling import AliasTable, restaurant_weight  # noqa: E402
+
+
+def make_pool(size, rng):
+    return [
+        {
+            'business_id': f"id-{index}",
+            'rating': rng.choice([2.0, 2.5, 3.0, 3.5, 4.0, 4.0, 4.5, 4.5, 5.0]),
+            'review_count': int(rng.paretovariate(1.2) * 3),
+        }
+        for index in range(size)
+    ]
+
+
+def naive_choices(ids, weights, k, rng):
+    """random.choices until k distinct IDs, rebuilding the cumulative weights on every call."""
+    chosen = {}
+    while len(chosen) < k:
+        chosen.setdefault(rng.choices(ids, weights)[0], None)
+    return list(chosen)
+
+
+def naive_without_replacement(ids, weights, k, rng):
+    """Draws one ID at a time by a linear scan, removing it before the next draw."""
+    ids, weights = list(ids), list(weights)
+    chosen = []
+    for _ in range(min(k, len(ids))):
+        target = rng.random() * sum(weights)
+        for index, weight in enumerate(weights):
+            target -= weight
+            if target < 0:
+                break
+        chosen.append(ids.pop(index))
+        weights.pop(index)
+    return chosen
+
+
+def time_per_call(func, draws):
+    started = time.perf_counter()
+    for _ in range(draws):
+        func()
+    return (time.perf_counter() - started) / draws * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pool-size', type=int, default=100000)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--draws', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    pool = make_pool(args.pool_size, rng)
+    ids = [restaurant['business_id'] for restaurant in pool]
+    weights = [restaurant_weight(restaurant) for restaurant in pool]
+
+    started = time.perf_counter()
+    table = AliasTable(ids, weights)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    naive_draws = max(1, args.draws // 100)
+    results = [
+        ('alias table', time_per_call(lambda: table.sample(args.k, rng), args.draws)),
+        ('random.choices', time_per_call(lambda: naive_choices(ids, weights, args.k, rng), naive_draws)),
+        ('linear scan', time_per_call(lambda: naive_without_replacement(ids, weights, args.k, rng), naive_draws)),
+    ]
+
+    print(f"pool of {args.pool_size}, k={args.k}; alias table built in {build_ms:.1f} ms")
+    print(f"{'sampler':<18}{'ms per draw':>14}{'slower than alias':>20}")
+    for name, milliseconds in results:
+        print(f"{name:<18}{milliseconds:>14.4f}{milliseconds / results[0][1]:>19.0f}x")
+
+    # The draws should follow the weights: compare the best and worst rated tenths
+    ranked = sorted(range(len(pool)), key=weights.__getitem__)
+    tenth = len(ranked) // 10
+    drawn = Counter(index for _ in range(args.draws) for index in (table.draw_index(rng) for _ in range(args.k)))
+    top, bottom = sum(drawn[index] for index in ranked[-tenth:]), sum(drawn[index] for index in ranked[:tenth])
+    expected = sum(weights[index] for index in ranked[-tenth:]) / sum(weights[index] for index in ranked[:tenth])
+    print(f"top/bottom tenth draws: {top}/{bottom}, expected ratio {expected:.1f}")
+
+
+if __name__ == '__main__':
+    main()
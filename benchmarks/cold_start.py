@@ -0,0 +1,179 @@
+"""
+Cold-start benchmark of the Lambda handlers.
+
+Every run starts a fresh interpreter, as a new Lambda container would, and
+measures how long importing the handler module takes, then the first and
+second invocation of a representative event. AWS calls go to the stand-ins in
+benchmarks/fakes.py, so the invocations never pay for importing boto3 or
+creating a client; the 'boto3 client' case measures that cost on its own, and
+the 'boto3' column shows which cases loaded it anyway.
+
+Usage:
+    python benchmarks/cold_start.py [--runs 5] [--case lf1-dialog ...]
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.join(BENCHMARKS_DIR, '..', 'lambda')
+SHARED_DIR = os.path.join(LAMBDA_DIR, 'shared')
+
+HANDLER_DIRS = {
+    'LF0': os.path.join(LAMBDA_DIR, 'LF0 Chat Handler'),
+    'LF1': os.path.join(LAMBDA_DIR, 'LF1 Dining Concierge Handler'),
+    'LF2': os.path.join(LAMBDA_DIR, 'LF2 Worker'),
+}
+
+BASE_ENV = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'SENDER_EMAIL': 'foody@example.com',
+    'SES_MAX_SEND_RATE': '14',
+    'QUEUE_URL': 'https://sqs.us-east-1.amazonaws.com/123456789012/dining',
+    'ES_HOST': 'http://127.0.0.1:9',
+}
+
+
+def lex_event(intent_name, invocation_source='DialogCodeHook', slots=None):
+    return {
+        'bot': {'name': 'DiningConcierge'},
+        'sessionId': 'bench-user',
+        'invocationSource': invocation_source,
+        'sessionState': {'intent': {'name': intent_name, 'slots': slots or {}}, 'sessionAttributes': {}},
+        'interpretations': [{'intent': {'name': intent_name, 'confirmationState': 'None'}}],
+    }
+
+
+def slot(value):
+    return {'value': {'interpretedValue': value}}
+
+
+def chat_event(text):
+    return {'messages': [{'type': 'unstructured', 'unstructured': {'id': 'bench-user', 'text': text}}]}
+
+
+def sqs_event():
+    body = {'Cuisine': 'Italian', 'Location': 'Manhattan', 'Email': 'diner@example.com', 'user_id': 'bench-user'}
+    return {'Records': [{'eventSource': 'aws:sqs', 'messageId': 'm-1', 'body': json.dumps(body)}]}
+
+
+# name: (handler, extra environment, event builder)
+CASES = {
+    'lf0-fast-path': ('LF0', {'FAST_PATH_MODE': 'on'}, lambda: chat_event('thanks!')),
+    'lf0-lex': ('LF0', {}, lambda: chat_event('I need restaurant suggestions')),
+    'lf1-thank-you': ('LF1', {}, lambda: lex_event('ThankYouIntent')),
+    'lf1-dialog': ('LF1', {}, lambda: lex_event('DiningSuggestionsIntent', slots={
+        'Location': slot('Manhattan'),
+        'Cuisine': slot('Italian'),
+        'DiningDate': slot((datetime.date.today() + datetime.timedelta(days=2)).isoformat()),
+        'DiningTime': slot('19:00'),
+        'NumberOfPeople': slot('4'),
+        'Email': slot('diner@example.com'),
+    })),
+    'lf1-greeting': ('LF1', {}, lambda: lex_event('GreetingIntent')),
+    'lf2-sqs': ('LF2', {}, sqs_event),
+    'boto3-client': (None, {}, None),
+}
+
+
+def write_candidate_pools(directory):
+    """Writes a small candidate pool artifact so that LF2 needs no search."""
+    sys.path[:0] = [HANDLER_DIRS['LF2'], SHARED_DIR]
+    from candidate_pools import write_candidate_pools as write
+
+    restaurants = [
+        {'business_id': f"id-{n}", 'name': f"Trattoria {n}", 'address': f"{n} Mulberry St",
+         'rating': 4.0 + n % 10 / 10, 'review_count': n, 'reviews': n}
+        for n in range(50)
+    ]
+    path = os.path.join(directory, 'pools.json.gz')
+    write({('italian', 'manhattan'): restaurants}, path, version='bench')
+    return path
+
+
+def child(case):
+    """Runs one case in this (fresh) interpreter and prints its timings as JSON."""
+    handler, _, build_event = CASES[case]
+
+    if handler is None:
+        started = time.perf_counter()
+        import boto3
+        imported = time.perf_counter()
+        boto3.client('sqs')
+        created = time.perf_counter()
+        print(json.dumps({'import_ms': (imported - started) * 1e3, 'first_ms': (created - imported) * 1e3,
+                          'second_ms': 0.0, 'boto3': True}))
+        return
+
+    sys.path[:0] = [HANDLER_DIRS[handler], SHARED_DIR]
+    started = time.perf_counter()
+    import lambda_function
+    imported = time.perf_counter()
+
+    sys.path.append(BENCHMARKS_DIR)
+    import aws_clients
+    from fakes import FakeDynamoDB, FakeLex, FakeSES
+
+    aws_clients.register_client('lexv2-runtime', FakeLex())
+    aws_clients.register_client('ses', FakeSES())
+    aws_clients.register_resource('dynamodb', FakeDynamoDB())
+    boto3_loaded = 'boto3' in sys.modules
+
+    event = build_event()
+    first_started = time.perf_counter()
+    lambda_function.lambda_handler(event, None)
+    first_done = time.perf_counter()
+    lambda_function.lambda_handler(build_event(), None)
+    second_done = time.perf_counter()
+
+    print(json.dumps({
+        'import_ms': (imported - started) * 1e3,
+        'first_ms': (first_done - first_started) * 1e3,
+        'second_ms': (second_done - first_done) * 1e3,
+        'boto3': boto3_loaded or 'boto3' in sys.modules,
+    }))
+
+
+def run_case(case, runs, env):
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', case],
+            env={**env, **CASES[case][1]}, capture_output=True, text=True, check=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold-start benchmark of the Lambda handlers")
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per case')
+    parser.add_argument('--case', action='append', choices=sorted(CASES), help='Cases to run (default: all)')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child(args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = {**os.environ, **BASE_ENV, 'CANDIDATE_POOLS_PATH': write_candidate_pools(directory)}
+
+        print(f"{'case':<16}{'import ms':>12}{'1st call ms':>14}{'2nd call ms':>14}{'boto3':>8}")
+        for case in args.case or list(CASES):
+            results = run_case(case, args.runs, env)
+            print(f"{case:<16}"
+                  f"{statistics.median(r['import_ms'] for r in results):>12.1f}"
+                  f"{statistics.median(r['first_ms'] for r in results):>14.1f}"
+                  f"{statistics.median(r['second_ms'] for r in results):>14.1f}"
+                  f"{'yes' if any(r['boto3'] for r in results) else 'no':>8}")
+
+
+if __name__ == '__main__':
+    main()
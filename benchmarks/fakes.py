@@ -0,0 +1,548 @@
+"""
+In-process stand-ins for the AWS services the handlers call.
+
+They implement just enough of the boto3 client API for the handlers, record
+every call and can inject latency and failures. Install them with
+aws_clients.register_client / register_resource. FakeElasticsearch serves
+_search and _bulk over HTTP on localhost, since LF2 and the ingestion CLI
+call it without boto3. FakeYelp stands in for the requests session of the
+ingestion CLI's YelpClient.
+"""
+import itertools
+import json
+import random
+import socket
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def client_error(code, message='', operation='Operation'):
+    """Builds the ClientError botocore raises for a service error code."""
+    # Imported here so that loading the fakes does not load botocore
+    from botocore.exceptions import ClientError
+
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+def check_integer_params(**params):
+    """Raises the ParamValidationError botocore raises for non-integer integer parameters."""
+    from botocore.exceptions import ParamValidationError
+
+    for name, value in params.items():
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ParamValidationError(report=(
+                f"Invalid type for parameter {name}, value: {value}, type: {type(value)}, "
+                f"valid types: <class 'int'>"))
+
+
+class FakeService:
+    """
+    Base class of the stand-ins: counts calls per operation and injects latency.
+
+    Args:
+        latency (float): Seconds every call sleeps before answering.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def _call(self, operation):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class FakeSES(FakeService):
+    """
+    A stand-in for the SES client.
+
+    Args:
+        latency (float): Seconds every call sleeps before answering.
+        max_send_rate (float): Returned by get_send_quota.
+        throttle_calls (int): The number of send calls rejected with a
+            Throttling error before calls succeed.
+        failing_recipients (dict): Per-destination statuses to return for
+            specific addresses, e.g. {'a@example.com': 'MessageRejected'}.
+    """
+
+    def __init__(self, latency=0.0, max_send_rate=50.0, throttle_calls=0, failing_recipients=None):
+        super().__init__(latency)
+        self.max_send_rate = max_send_rate
+        self.throttle_calls = throttle_calls
+        self.failing_recipients = dict(failing_recipients or {})
+        self.templates = {}
+        self.sent = []
+        self._ids = itertools.count(1)
+
+    def get_send_quota(self):
+        self._call('get_send_quota')
+        return {'Max24HourSend': 50000.0, 'MaxSendRate': self.max_send_rate, 'SentLast24Hours': 0.0}
+
+    def get_template(self, TemplateName):
+        self._call('get_template')
+        if TemplateName not in self.templates:
+            raise client_error('TemplateDoesNotExist', TemplateName, 'GetTemplate')
+        return {'Template': self.templates[TemplateName]}
+
+    def create_template(self, Template):
+        self._call('create_template')
+        self.templates[Template['TemplateName']] = Template
+        return {}
+
+    def _throttled(self):
+        with self._lock:
+            if self.throttle_calls > 0:
+                self.throttle_calls -= 1
+                return True
+        return False
+
+    def send_email(self, Source, Destination, Message):
+        self._call('send_email')
+        if self._throttled():
+            raise client_error('Throttling', 'Maximum sending rate exceeded.', 'SendEmail')
+        with self._lock:
+            self.sent.extend(Destination['ToAddresses'])
+        return {'MessageId': f"fake-{next(self._ids)}"}
+
+    def send_bulk_templated_email(self, Source, Template, DefaultTemplateData, Destinations):
+        self._call('send_bulk_templated_email')
+        if Template not in self.templates:
+            raise client_error('TemplateDoesNotExist', Template, 'SendBulkTemplatedEmail')
+        if self._throttled():
+            raise client_error('Throttling', 'Maximum sending rate exceeded.', 'SendBulkTemplatedEmail')
+
+        statuses = []
+        with self._lock:
+            for destination in Destinations:
+                recipient = destination['Destination']['ToAddresses'][0]
+                status = self.failing_recipients.get(recipient)
+                if status is None:
+                    self.sent.append(recipient)
+                    statuses.append({'Status': 'Success', 'MessageId': f"fake-{next(self._ids)}"})
+                else:
+                    statuses.append({'Status': status, 'Error': f"Fake {status}"})
+        return {'Status': statuses}
+
+
+class FakeLex(FakeService):
+    """
+    A stand-in for the Lex V2 runtime client.
+
+    Args:
+        latency (float): Seconds every call sleeps before answering.
+        replies (dict): Messages to answer specific texts with; anything else
+            is echoed back.
+    """
+
+    def __init__(self, latency=0.0, replies=None):
+        super().__init__(latency)
+        self.replies = dict(replies or {})
+
+    def recognize_text(self, botId, botAliasId, sessionId, localeId, text):
+        self._call('recognize_text')
+        content = self.replies.get(text, f"You said: {text}")
+        return {
+            'sessionId': sessionId,
+            'sessionState': {'intent': {'name': 'FallbackIntent'}},
+            'messages': [{'contentType': 'PlainText', 'content': content}],
+        }
+
+
+def project(item, expression=None, names=None):
+    """Applies a ProjectionExpression of top-level or nested attributes to an item."""
+    if not expression:
+        return item
+
+    names = names or {}
+    projected = {}
+    for path in expression.split(','):
+        parts = [names.get(part, part) for part in path.strip().split('.')]
+        source, target = item, projected
+        for part in parts[:-1]:
+            source = source.get(part) if isinstance(source, dict) else None
+            target = target.setdefault(part, {})
+        if isinstance(source, dict) and parts[-1] in source:
+            target[parts[-1]] = source[parts[-1]]
+    return {key: value for key, value in projected.items() if value != {}}
+
+
+class FakeTable:
+    """An in-memory DynamoDB table keyed on one attribute."""
+
+    def __init__(self, service, name, key='user_id'):
+        self.service = service
+        self.name = name
+        self.key = key
+        self.items = {}
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        self.service._call('get_item')
+        item = self.items.get(Key[self.key])
+        if item is None:
+            return {}
+        return {'Item': project(item, ProjectionExpression, ExpressionAttributeNames)}
+
+    def put_item(self, Item, **kwargs):
+        self.service._call('put_item')
+        self.items[Item[self.key]] = Item
+        return {}
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return FakeBatchWriter(self, overwrite_by_pkeys)
+
+
+class FakeBatchWriter:
+    """
+    The batch_writer of a FakeTable.
+
+    Like boto3's, it buffers puts, sends them in batch_write_item calls of 25,
+    flushes the rest on exit, and keeps only the last put of a key when
+    overwrite_by_pkeys is set.
+    """
+
+    BATCH_SIZE = 25
+
+    def __init__(self, table, overwrite_by_pkeys=None):
+        self.table = table
+        self.overwrite_by_pkeys = overwrite_by_pkeys
+        self._buffer = []
+
+    def put_item(self, Item):
+        if self.overwrite_by_pkeys:
+            key = [Item[name] for name in self.overwrite_by_pkeys]
+            self._buffer = [item for item in self._buffer if [item[name] for name in self.overwrite_by_pkeys] != key]
+        self._buffer.append(Item)
+        if len(self._buffer) >= self.BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        batch, self._buffer = self._buffer[:self.BATCH_SIZE], self._buffer[self.BATCH_SIZE:]
+        self.table.service.batch_write_item(self.table, batch)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        while self._buffer:
+            self._flush()
+
+
+class FakeDynamoDB(FakeService):
+    """
+    A stand-in for the DynamoDB resource.
+
+    Args:
+        latency (float): Seconds every call sleeps before answering.
+        keys (dict): The key attribute of each table; defaults to 'user_id'.
+        unprocessed_rate (float): The share of batch_get_item keys returned as
+            UnprocessedKeys.
+
+    Attributes:
+        batch_write_budget (int): How many more batch_write_item calls succeed
+            before they fail with InternalServerError, or None for no limit.
+            Set it to interrupt a batch_writer mid-run.
+    """
+
+    def __init__(self, latency=0.0, keys=None, unprocessed_rate=0.0):
+        super().__init__(latency)
+        self.keys = dict(keys or {})
+        self.unprocessed_rate = unprocessed_rate
+        self.batch_write_budget = None
+        self.tables = {}
+
+    def Table(self, name):
+        with self._lock:
+            table = self.tables.get(name)
+            if table is None:
+                table = self.tables[name] = FakeTable(self, name, self.keys.get(name, 'user_id'))
+        return table
+
+    def batch_get_item(self, RequestItems):
+        self._call('batch_get_item')
+        responses = {}
+        unprocessed = {}
+
+        for name, request in RequestItems.items():
+            table = self.Table(name)
+            keys = list(request['Keys'])
+            if self.unprocessed_rate:
+                # Hand back a share of the keys, as DynamoDB does when throttled
+                held = [key for key in keys if random.random() < self.unprocessed_rate]
+                if held:
+                    unprocessed[name] = {**request, 'Keys': held}
+                    keys = [key for key in keys if key not in held]
+
+            responses[name] = [
+                project(table.items[key[table.key]], request.get('ProjectionExpression'),
+                        request.get('ExpressionAttributeNames'))
+                for key in keys if key[table.key] in table.items
+            ]
+
+        return {'Responses': responses, 'UnprocessedKeys': unprocessed}
+
+    def batch_write_item(self, table, items):
+        """Writes up to 25 items of a batch_writer, or fails once batch_write_budget is spent."""
+        self._call('batch_write_item')
+        with self._lock:
+            if self.batch_write_budget is not None:
+                if self.batch_write_budget <= 0:
+                    raise client_error('InternalServerError', 'Injected failure', 'BatchWriteItem')
+                self.batch_write_budget -= 1
+            for item in items:
+                table.items[item[table.key]] = item
+
+
+class QueueDoesNotExist(Exception):
+    pass
+
+
+class FakeSQS(FakeService):
+    """
+    A stand-in for the SQS client holding a single in-memory queue.
+
+    Received messages stay in flight until they are deleted or handed back
+    with requeue_in_flight, which stands in for the visibility timeout.
+
+    Args:
+        latency (float): Seconds every call sleeps before answering.
+    """
+
+    class exceptions:
+        QueueDoesNotExist = QueueDoesNotExist
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.queue = deque()
+        self.sent = []
+        self.in_flight = {}
+        self.receive_counts = {}
+        self._ids = itertools.count(1)
+
+    def __len__(self):
+        return len(self.queue)
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        self._call('send_message')
+        message_id = f"msg-{next(self._ids)}"
+        with self._lock:
+            self.queue.append({'MessageId': message_id, 'Body': MessageBody})
+            self.sent.append({'MessageId': message_id, 'Body': MessageBody})
+        return {'MessageId': message_id}
+
+    def redeliver(self, messages):
+        """Queues already handled messages again, as at-least-once delivery may."""
+        with self._lock:
+            self.queue.extend(dict(message) for message in messages)
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0, **kwargs):
+        check_integer_params(MaxNumberOfMessages=MaxNumberOfMessages, WaitTimeSeconds=WaitTimeSeconds)
+        self._call('receive_message')
+        messages = []
+        with self._lock:
+            while self.queue and len(messages) < MaxNumberOfMessages:
+                message = self.queue.popleft()
+                count = self.receive_counts[message['MessageId']] = self.receive_counts.get(message['MessageId'], 0) + 1
+                receipt_handle = f"{message['MessageId']}#{count}"
+                self.in_flight[receipt_handle] = message
+                messages.append({**message, 'ReceiptHandle': receipt_handle,
+                                 'Attributes': {'ApproximateReceiveCount': str(count)}})
+        return {'Messages': messages} if messages else {}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        self._call('delete_message_batch')
+        successful, failed = [], []
+        with self._lock:
+            for entry in Entries:
+                if self.in_flight.pop(entry['ReceiptHandle'], None) is None:
+                    failed.append({'Id': entry['Id'], 'Code': 'ReceiptHandleIsInvalid', 'SenderFault': True})
+                else:
+                    successful.append({'Id': entry['Id']})
+        return {'Successful': successful, 'Failed': failed}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        self._call('change_message_visibility_batch')
+        with self._lock:
+            successful = [{'Id': entry['Id']} for entry in Entries if entry['ReceiptHandle'] in self.in_flight]
+            failed = [
+                {'Id': entry['Id'], 'Code': 'ReceiptHandleIsInvalid', 'SenderFault': True}
+                for entry in Entries if entry['ReceiptHandle'] not in self.in_flight
+            ]
+        return {'Successful': successful, 'Failed': failed}
+
+    def requeue_in_flight(self):
+        """Makes every in-flight message visible again, as if its timeout expired."""
+        with self._lock:
+            self.queue.extend(self.in_flight.values())
+            self.in_flight.clear()
+
+
+class FakeElasticsearch(FakeService):
+    """
+    A local HTTP server answering the _search requests LF2 sends and the
+    _bulk requests of the ingestion CLI.
+
+    Only the cuisine match and random_score queries LF2 builds are supported,
+    and only index and delete bulk actions.
+
+    Args:
+        documents (dict): The cuisine of every restaurant, keyed by business ID.
+        latency (float): Seconds every request sleeps before answering.
+        failing_ids (set): Document IDs whose bulk actions are rejected.
+    """
+
+    def __init__(self, documents, latency=0.0, failing_ids=None):
+        super().__init__(latency)
+        self.documents = {}
+        self.by_cuisine = {}
+        self.failing_ids = set(failing_ids or ())
+        for business_id, cuisine in documents.items():
+            self._index(business_id, cuisine)
+        self._server = None
+
+    def _index(self, business_id, cuisine):
+        self._delete(business_id)
+        self.documents[business_id] = cuisine
+        self.by_cuisine.setdefault(cuisine.lower(), []).append(business_id)
+
+    def _delete(self, business_id):
+        cuisine = self.documents.pop(business_id, None)
+        if cuisine is None:
+            return False
+        self.by_cuisine[cuisine.lower()].remove(business_id)
+        return True
+
+    def search(self, body):
+        self._call('search')
+        query = body['query']
+        function_score = query.get('function_score')
+        match = (function_score['query'] if function_score else query)['match']['Cuisine']['query']
+        ids = self.by_cuisine.get(match.lower(), [])
+
+        size = min(body.get('size', 10), len(ids))
+        if function_score:
+            ids = random.Random(function_score['random_score'].get('seed')).sample(ids, size)
+        else:
+            ids = ids[:size]
+        return {'hits': {'total': {'value': len(ids)}, 'hits': [{'_id': business_id} for business_id in ids]}}
+
+    def bulk(self, lines):
+        """Applies the actions of a _bulk request body, given as decoded NDJSON lines."""
+        self._call('bulk')
+        items = []
+        lines = iter(lines)
+        with self._lock:
+            for line in lines:
+                (action, meta), = line.items()
+                business_id = meta['_id']
+                source = next(lines) if action == 'index' else None
+
+                if business_id in self.failing_ids:
+                    items.append({action: {'_id': business_id, 'status': 400,
+                                           'error': {'type': 'mapper_parsing_exception'}}})
+                elif action == 'index':
+                    self._index(business_id, source['Cuisine'])
+                    items.append({action: {'_id': business_id, 'status': 200, 'result': 'updated'}})
+                elif self._delete(business_id):
+                    items.append({action: {'_id': business_id, 'status': 200, 'result': 'deleted'}})
+                else:
+                    items.append({action: {'_id': business_id, 'status': 404, 'result': 'not_found'}})
+
+        return {'errors': any('error' in next(iter(item.values())) for item in items), 'items': items}
+
+    def start(self):
+        """Starts serving on a free localhost port and returns its URL."""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                # Headers and body are written separately; without this, delayed
+                # ACKs add ~40 ms to every response
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_GET(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                self._respond(fake.search(body))
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+                if self.path.rstrip('/') != '/_bulk':
+                    self.send_error(404)
+                    return
+                self._respond(fake.bulk(json.loads(line) for line in body.splitlines() if line))
+
+            def _respond(self, result):
+                payload = json.dumps(result).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class FakeHTTPResponse:
+    """The part of a requests Response that YelpClient uses."""
+
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+
+            raise requests.HTTPError(f"{self.status_code} Error", response=self)
+
+
+class FakeYelp(FakeService):
+    """
+    A stand-in for the requests session of the ingestion CLI's YelpClient.
+
+    It answers the business search from an in-memory catalog, a page of
+    results at a time, the way the Yelp API pages through 'total' results.
+
+    Args:
+        businesses (dict): The Yelp businesses returned for each search term,
+            in result order. Edit it between runs to change the catalog.
+        latency (float): Seconds every request sleeps before answering.
+        failing_pages (set): (term, offset) pages answered with HTTP 500.
+    """
+
+    def __init__(self, businesses, latency=0.0, failing_pages=None):
+        super().__init__(latency)
+        self.businesses = businesses
+        self.failing_pages = set(failing_pages or ())
+        self.headers = {}
+
+    def get(self, url, params=None, timeout=None):
+        self._call('search')
+        term, offset, limit = params['term'], int(params.get('offset', 0)), int(params.get('limit', 20))
+        if (term, offset) in self.failing_pages:
+            return FakeHTTPResponse(500, {'error': {'code': 'INTERNAL_ERROR'}})
+
+        results = self.businesses.get(term, [])
+        return FakeHTTPResponse(200, {'businesses': results[offset:offset + limit], 'total': len(results)})
@@ -0,0 +1,244 @@
+"""
+End-to-end harness for the catalog ingestion CLI (other/ingest.py), run against local fakes.
+
+Yelp, the yelp-restaurants batch_writer and the OpenSearch _bulk endpoint are
+the stand-ins in benchmarks/fakes.py, so the real YelpClient,
+OpenSearchBulkIndexer and incremental refresh run unchanged. The harness
+runs, with one manifest:
+    1. A full ingest of a synthetic catalog, where some _bulk actions fail.
+    2. An incremental run after some restaurants changed, were added or were
+       removed, interrupted by failing DynamoDB writes partway through.
+    3. The resume of that run from its checkpoint, which only refetches the
+       cuisines the interrupted run did not complete, tombstones the removed
+       restaurants and indexes again what failed to index in the first run.
+    4. A run with nothing changed, which writes nothing.
+    5. Runs of single cuisines (--cuisines) after a restaurant that two
+       cuisines return is dropped by one of them, then by the other: it is
+       only tombstoned once neither returns it. This is done for two such
+       restaurants, in opposite orders.
+
+Each run reports the ingestion stats and the calls every fake received, and
+the stored catalog is checked against Yelp after every completed run.
+
+Usage:
+    python benchmarks/ingest_harness.py [--per-cuisine 400] [--churn 0.05] [--interrupt-after 6]
+                                        [--index-failures 3] [--shared 5] [--latency 2]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BENCHMARKS_DIR, os.path.normpath(os.path.join(BENCHMARKS_DIR, '..', 'other'))]
+
+from fakes import FakeDynamoDB, FakeElasticsearch, FakeYelp  # noqa: E402
+from ingest import CUISINES, Manifest, OpenSearchBulkIndexer, TokenBucket, YelpClient, ingest  # noqa: E402
+
+TABLE_NAME = 'yelp-restaurants'
+LOCATION = 'Manhattan'
+
+
+def make_business(cuisine, number, rng):
+    """Builds a Yelp business the way the search API returns it."""
+    return {
+        'id': f"{cuisine.lower()}-{number:05d}",
+        'name': f"{cuisine} Place {number}",
+        'location': {'display_address': [f"{number} Broadway", 'New York, NY'], 'zip_code': f"100{rng.randint(0, 40):02d}"},
+        'coordinates': {'latitude': round(rng.uniform(40.70, 40.80), 6), 'longitude': round(rng.uniform(-74.02, -73.93), 6)},
+        'review_count': rng.randint(1, 3000),
+        'rating': rng.choice([2.5, 3.0, 3.5, 4.0, 4.5, 5.0]),
+        'categories': [{'title': cuisine}],
+    }
+
+
+def churn(businesses, share, rng, next_number, keep=()):
+    """
+    Changes, removes and adds a share of the businesses of every cuisine.
+
+    Businesses in keep are never removed.
+
+    Returns:
+        tuple: (IDs changed or added, IDs removed).
+    """
+    written, removed = set(), set()
+    for cuisine, results in businesses.items():
+        count = max(1, int(len(results) * share))
+        for business in rng.sample(results, count):
+            business['review_count'] += 1
+            written.add(business['id'])
+        removable = [business for business in results if business['id'] not in written and business['id'] not in keep]
+        for business in rng.sample(removable, count):
+            results.remove(business)
+            removed.add(business['id'])
+        for _ in range(count):
+            business = make_business(cuisine, next(next_number), rng)
+            results.insert(rng.randrange(len(results) + 1), business)
+            written.add(business['id'])
+    return written, removed
+
+
+def check_catalog(businesses, table, es, removed):
+    """Compares the stored catalog with what Yelp returns; returns a list of problems."""
+    problems = []
+    current = {business['id']: business for results in businesses.values() for business in results}
+
+    for business_id, business in current.items():
+        item = table.items.get(business_id)
+        if item is None or item.get('deleted') or item.get('review_count') != business['review_count']:
+            problems.append(f"{business_id} is missing or stale in DynamoDB")
+        if es.documents.get(business_id) != business['categories'][0]['title']:
+            problems.append(f"{business_id} is missing from OpenSearch")
+
+    for business_id in removed:
+        if not table.items.get(business_id, {}).get('deleted'):
+            problems.append(f"{business_id} was removed but not tombstoned")
+        if business_id in es.documents:
+            problems.append(f"{business_id} was removed but is still indexed")
+
+    if set(es.documents) != set(current):
+        problems.append(f"OpenSearch holds {len(es.documents)} documents, Yelp returns {len(current)}")
+    return problems
+
+
+def run(label, args, yelp, table, indexer, manifest_path, backends, cuisines=CUISINES):
+    """Runs one ingestion with a manifest loaded from disk, as a new process would."""
+    before = {name: dict(fake.calls) for name, fake in backends.items()}
+    manifest = Manifest(manifest_path)
+    client = YelpClient('fake-key', TokenBucket(args.rate, capacity=args.concurrency), session=yelp)
+
+    started = time.perf_counter()
+    try:
+        stats, _ = ingest(client, table, indexer, cuisines, LOCATION, args.concurrency, args.bulk_size, manifest=manifest)
+        report, error = stats.report(), None
+    except Exception as e:
+        report, error = None, e
+    elapsed = time.perf_counter() - started
+
+    print(f"\n== {label} ({elapsed:.2f} s)")
+    if error is None:
+        print(json.dumps(report))
+    else:
+        checkpoint = Manifest(manifest_path).checkpoint or {}
+        print(f"interrupted: {error}")
+        print(f"checkpoint: completed {checkpoint.get('completed', [])}, {len(checkpoint.get('seen', []))} seen")
+
+    for name, fake in backends.items():
+        calls = {operation: count - before[name].get(operation, 0) for operation, count in fake.calls.items()}
+        print(f"{name:<12}" + (', '.join(f"{operation} {count}" for operation, count in sorted(calls.items()) if count) or '-'))
+    return report, error
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end harness for the catalog ingestion CLI")
+    parser.add_argument('--per-cuisine', type=int, default=400, help='Restaurants Yelp returns per cuisine (at most 1000)')
+    parser.add_argument('--churn', type=float, default=0.05,
+                        help='Share of each cuisine changed, removed and added before the incremental run')
+    parser.add_argument('--interrupt-after', type=int, default=6,
+                        help='batch_write_item calls the incremental run makes before DynamoDB starts failing')
+    parser.add_argument('--index-failures', type=int, default=3,
+                        help='Restaurants whose _bulk actions fail during the full ingest')
+    parser.add_argument('--shared', type=int, default=5,
+                        help='Restaurants that a second cuisine also returns (at least 2 to run step 5)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Milliseconds injected per call to every fake')
+    parser.add_argument('--concurrency', type=int, default=8, help='Yelp pages fetched in parallel')
+    parser.add_argument('--rate', type=float, default=1000.0, help='Yelp requests per second')
+    parser.add_argument('--bulk-size', type=int, default=100, help='Documents per flush')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.CRITICAL)
+    rng = random.Random(args.seed)
+    latency = args.latency / 1000
+    numbers = iter(range(args.per_cuisine, 10 ** 5))
+
+    businesses = {cuisine: [make_business(cuisine, number, rng) for number in range(args.per_cuisine)]
+                  for cuisine in CUISINES}
+    # Yelp returns some restaurants for more than one cuisine search
+    shared = []
+    for business in rng.sample([business for results in businesses.values() for business in results], args.shared):
+        other = rng.choice([cuisine for cuisine in CUISINES if cuisine != business['categories'][0]['title']])
+        businesses[other].insert(rng.randrange(len(businesses[other]) + 1), business)
+        shared.append((business, other))
+    yelp = FakeYelp(businesses, latency)
+    dynamodb = FakeDynamoDB(latency, keys={TABLE_NAME: 'business_id'})
+    table = dynamodb.Table(TABLE_NAME)
+    es = FakeElasticsearch({}, latency)
+    indexer = OpenSearchBulkIndexer(es.start(), ('user', 'password'))
+    backends = {'yelp': yelp, 'dynamodb': dynamodb, 'opensearch': es}
+
+    workdir = tempfile.TemporaryDirectory()
+    manifest_path = os.path.join(workdir.name, 'manifest.json')
+    problems = []
+    written, removed = set(), set()
+    try:
+        total = len(CUISINES) * args.per_cuisine
+        es.failing_ids = {business['id'] for business in rng.sample(
+            [business for results in businesses.values() for business in results], args.index_failures)}
+        report, error = run('full ingest', args, yelp, table, indexer, manifest_path, backends)
+        es.failing_ids = set()
+        if error or report['written'] != total or report['indexed'] != total - args.index_failures:
+            problems.append(f"full ingest did not write all {total} restaurants")
+
+        written, removed = churn(businesses, args.churn, rng, numbers, {business['id'] for business, _ in shared})
+        dynamodb.batch_write_budget = args.interrupt_after
+        report, error = run('incremental run, interrupted', args, yelp, table, indexer, manifest_path, backends)
+        dynamodb.batch_write_budget = None
+        completed = (Manifest(manifest_path).checkpoint or {}).get('completed', [])
+        if error is None:
+            problems.append("the incremental run was not interrupted; lower --interrupt-after")
+        tombstoned = report['tombstoned'] if report else 0
+
+        searches = yelp.calls.get('search', 0)
+        report, error = run('resume', args, yelp, table, indexer, manifest_path, backends)
+        problems += check_catalog(businesses, table, es, removed)
+        if error or tombstoned + report['tombstoned'] != len(removed):
+            problems.append(f"the {len(removed)} removed restaurants were not all tombstoned")
+        elif report['written'] > len(written):
+            problems.append(f"resume wrote {report['written']} restaurants, only {len(written)} changed")
+        # Churn keeps the number of restaurants per cuisine, and so its pages
+        pages = max(-(-len(results) // 50) for results in businesses.values())
+        if yelp.calls['search'] - searches > (len(CUISINES) - len(completed)) * pages:
+            problems.append(f"resume refetched cuisines completed before the interruption: {completed}")
+
+        report, error = run('unchanged', args, yelp, table, indexer, manifest_path, backends)
+        if error or report['written'] or report['tombstoned'] or report['unchanged'] != report['fetched']:
+            problems.append("a run with nothing changed wrote or tombstoned restaurants")
+
+        # Each of two such restaurants is dropped by its cuisines in opposite orders
+        for (business, other), own_first in zip(shared, (True, False)):
+            own = business['categories'][0]['title']
+            first, second = (own, other) if own_first else (other, own)
+
+            businesses[first].remove(business)
+            report, error = run(f"{first} only, which dropped {business['id']}", args, yelp, table, indexer,
+                                manifest_path, backends, [first])
+            problems += check_catalog(businesses, table, es, removed)
+            if error or report['tombstoned']:
+                problems.append(f"{business['id']} was tombstoned while {second} still returns it")
+
+            businesses[second].remove(business)
+            removed.add(business['id'])
+            report, error = run(f"{second} only, which dropped it too", args, yelp, table, indexer,
+                                manifest_path, backends, [second])
+            problems += check_catalog(businesses, table, es, removed)
+            if error or report['tombstoned'] != 1:
+                problems.append(f"{business['id']} was not tombstoned once no cuisine returned it")
+
+    finally:
+        es.stop()
+        workdir.cleanup()
+
+    print(f"\n{len(written)} changed or added and {len(removed)} removed in all")
+    for problem in problems[:20]:
+        print(f"FAILED: {problem}")
+    print("Catalog consistent" if not problems else f"{len(problems)} problems")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
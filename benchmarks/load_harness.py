@@ -0,0 +1,389 @@
+"""
+End-to-end load harness for LF1 and LF2, run in-process against local fakes.
+
+Synthetic users hold a full conversation with LF1: a greeting, one dialog
+turn per filled slot, and fulfillment. Fulfillment queues the reservation on
+a fake SQS queue. Batches from that queue are then delivered to LF2 the way an
+SQS event source mapping would. Finally, returning users greet the bot again
+and confirm that they want their past suggestions by email. SQS, DynamoDB
+(yelp-restaurants and past-restaurant-suggestions), SES and the Elasticsearch
+_search endpoint are the stand-ins in benchmarks/fakes.py, with optional
+injected latency.
+
+The report shows throughput per phase, p50/p95/p99 latency per traced stage,
+and the number of calls each fake backend received.
+
+Usage:
+    python benchmarks/load_harness.py [--users 200] [--latency 5] [--latency ses=40]
+                                      [--lf2-concurrency 4] [--candidate-pools] [--redeliver 0.2]
+"""
+import argparse
+import datetime
+import importlib
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.normpath(os.path.join(BENCHMARKS_DIR, '..', 'lambda'))
+SHARED_DIR = os.path.join(LAMBDA_DIR, 'shared')
+LF1_DIR = os.path.join(LAMBDA_DIR, 'LF1 Dining Concierge Handler')
+LF2_DIR = os.path.join(LAMBDA_DIR, 'LF2 Worker')
+
+sys.path[:0] = [SHARED_DIR, BENCHMARKS_DIR]
+
+from fakes import FakeDynamoDB, FakeElasticsearch, FakeSES, FakeSQS  # noqa: E402
+
+CUISINES = ['thai', 'indian', 'french', 'italian', 'mexican', 'chinese', 'japanese']
+SERVICES = ['sqs', 'dynamodb', 'ses', 'es']
+
+# The order in which a user fills the dining slots, one per dialog turn
+SLOT_ORDER = ['Location', 'Cuisine', 'DiningDate', 'DiningTime', 'NumberOfPeople', 'Email']
+
+# Messages received more often than this are dropped, as a redrive policy would
+MAX_RECEIVE_COUNT = 3
+
+
+def load_handler(directory, name):
+    """
+    Imports a handler's lambda_function under its own name.
+
+    Every handler ships a module called lambda_function, and may ship others
+    that clash with another handler's, so the handler's own modules are
+    imported from its directory and then removed from sys.modules again.
+
+    Args:
+        directory (str): The handler directory.
+        name (str): A unique name for the returned module.
+
+    Returns:
+        module: The handler's lambda_function module.
+    """
+    before = set(sys.modules)
+    sys.path.insert(0, directory)
+    try:
+        module = importlib.import_module('lambda_function')
+    finally:
+        sys.path.remove(directory)
+
+    for module_name in set(sys.modules) - before:
+        module_file = getattr(sys.modules[module_name], '__file__', None) or ''
+        if os.path.dirname(os.path.abspath(module_file)) == directory:
+            del sys.modules[module_name]
+
+    sys.modules[name] = module
+    return module
+
+
+class HarnessMetrics:
+    """Replaces tracing.metrics and keeps every stage duration of the run."""
+
+    def __init__(self, metrics_class):
+        self._metrics = metrics_class()
+        self._lock = threading.Lock()
+        self.durations = {}
+        self.errors = {}
+        self.counts = {}
+
+    def add_duration(self, stage_name, milliseconds, failed=False):
+        self._metrics.add_duration(stage_name, milliseconds, failed)
+
+    def count(self, name, value=1):
+        self._metrics.count(name, value)
+
+    def flush(self, function_name, stream=None):
+        durations, counts = self._metrics.drain()
+        with self._lock:
+            for stage_name, (values, errors) in durations.items():
+                key = (function_name, stage_name)
+                self.durations.setdefault(key, []).extend(values)
+                self.errors[key] = self.errors.get(key, 0) + errors
+            for name, value in counts.items():
+                self.counts[(function_name, name)] = self.counts.get((function_name, name), 0) + value
+
+
+class FakeContext:
+    """The part of the Lambda context the handlers use."""
+
+    def __init__(self, timeout_ms):
+        self._deadline = time.monotonic() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(share * len(ordered))) - 1))]
+
+
+def make_catalog(count, rng):
+    """Builds the restaurant records stored in yelp-restaurants."""
+    return [
+        {
+            'business_id': f"biz-{number:06d}",
+            'name': f"Restaurant {number}",
+            'address': f"{number} Broadway, New York, NY",
+            'cuisine': CUISINES[number % len(CUISINES)],
+            'rating': Decimal(str(round(rng.uniform(2.5, 5.0), 1))),
+            'review_count': rng.randint(1, 3000),
+            'reviews': rng.randint(1, 3000),
+        }
+        for number in range(count)
+    ]
+
+
+def lex_event(user_id, intent_name, slots=None, invocation_source='DialogCodeHook', confirmation='None'):
+    return {
+        'bot': {'name': 'DiningConcierge'},
+        'sessionId': user_id,
+        'invocationSource': invocation_source,
+        'sessionState': {'intent': {'name': intent_name, 'slots': slots or {}}, 'sessionAttributes': {}},
+        'interpretations': [{'intent': {'name': intent_name, 'confirmationState': confirmation}}],
+    }
+
+
+def conversation(user_id, rng):
+    """Yields the Lex events of one user asking for suggestions."""
+    values = {
+        'Location': 'Manhattan',
+        'Cuisine': rng.choice(CUISINES).title(),
+        'DiningDate': (datetime.date.today() + datetime.timedelta(days=rng.randint(1, 14))).isoformat(),
+        'DiningTime': f"{rng.randint(11, 22)}:{rng.choice(['00', '15', '30', '45'])}",
+        'NumberOfPeople': str(rng.randint(1, 8)),
+        'Email': f"{user_id}@example.com",
+    }
+
+    yield lex_event(user_id, 'GreetingIntent')
+    slots = {}
+    for name in SLOT_ORDER:
+        slots[name] = {'value': {'interpretedValue': values[name]}}
+        yield lex_event(user_id, 'DiningSuggestionsIntent', dict(slots))
+    yield lex_event(user_id, 'DiningSuggestionsIntent', dict(slots), 'FulfillmentCodeHook')
+
+
+def run_lf1(lf1, events, timeout_ms):
+    """Invokes LF1 once per event, one at a time as a single container would."""
+    for event in events:
+        lf1.lambda_handler(event, FakeContext(timeout_ms))
+
+
+def run_lf2(lf2, sqs, batch_size, concurrency, timeout_ms, poll=False):
+    """
+    Delivers the queued messages to LF2 in batches, as an event source mapping would.
+
+    With poll, LF2 receives the messages itself instead (see run_lf2_poll).
+
+    Returns:
+        tuple: The number of messages processed and dropped after too many receives.
+    """
+    lock = threading.Lock()
+    totals = {'processed': 0, 'dropped': 0}
+
+    if poll:
+        return run_lf2_poll(lf2, sqs, concurrency, timeout_ms)
+
+    def worker():
+        while True:
+            with lock:
+                received = sqs.receive_message('queue', MaxNumberOfMessages=batch_size).get('Messages', [])
+            if not received:
+                return
+
+            event = {'Records': [
+                {'eventSource': 'aws:sqs', 'messageId': message['MessageId'], 'receiptHandle': message['ReceiptHandle'],
+                 'body': message['Body'], 'attributes': message['Attributes']}
+                for message in received
+            ]}
+            response = lf2.lambda_handler(event, FakeContext(timeout_ms))
+            failed = {item['itemIdentifier'] for item in response.get('batchItemFailures', [])}
+
+            done = [message for message in received if message['MessageId'] not in failed]
+            if done:
+                sqs.delete_message_batch('queue', [
+                    {'Id': str(index), 'ReceiptHandle': message['ReceiptHandle']} for index, message in enumerate(done)
+                ])
+
+            with lock:
+                totals['processed'] += len(done)
+                for message in received:
+                    if message['MessageId'] not in failed:
+                        continue
+                    handle = message['ReceiptHandle']
+                    if int(message['Attributes']['ApproximateReceiveCount']) >= MAX_RECEIVE_COUNT:
+                        sqs.in_flight.pop(handle, None)
+                        totals['dropped'] += 1
+                    else:
+                        sqs.queue.append(sqs.in_flight.pop(handle))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+
+    return totals['processed'], totals['dropped']
+
+
+def run_lf2_poll(lf2, sqs, concurrency, timeout_ms):
+    """
+    Invokes LF2 in scheduled-poll mode until the queue is drained.
+
+    Messages left in flight after an invocation are made visible again, as
+    their visibility timeout would, for up to MAX_RECEIVE_COUNT rounds.
+
+    Returns:
+        tuple: The number of messages processed and the number left over.
+    """
+    queued = len(sqs)
+    for _ in range(MAX_RECEIVE_COUNT):
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for future in [executor.submit(lf2.lambda_handler, {}, FakeContext(timeout_ms))
+                           for _ in range(concurrency)]:
+                future.result()
+        sqs.requeue_in_flight()
+        if not len(sqs):
+            break
+    return queued - len(sqs), len(sqs)
+
+
+def parse_latencies(specs):
+    """Turns ['5', 'ses=40'] into per-service latencies in seconds."""
+    latencies = dict.fromkeys(SERVICES, 0.0)
+    for spec in specs or []:
+        service, _, value = spec.rpartition('=')
+        for name in ([service] if service else SERVICES):
+            if name not in latencies:
+                raise SystemExit(f"Unknown service {name!r}; expected one of {', '.join(SERVICES)}")
+            latencies[name] = float(value) / 1000
+    return latencies
+
+
+def print_report(phases, recorder, backends):
+    print(f"\n{'phase':<34}{'count':>8}{'seconds':>10}{'per second':>12}")
+    for name, count, seconds in phases:
+        print(f"{name:<34}{count:>8}{seconds:>10.2f}{count / seconds if seconds else 0:>12.1f}")
+
+    print(f"\n{'function':<10}{'stage':<18}{'calls':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for (function_name, stage_name), values in sorted(recorder.durations.items()):
+        print(f"{function_name:<10}{stage_name:<18}{len(values):>8}{recorder.errors[(function_name, stage_name)]:>8}"
+              f"{percentile(values, 0.50):>10.2f}{percentile(values, 0.95):>10.2f}{percentile(values, 0.99):>10.2f}")
+
+    if recorder.counts:
+        print(f"\n{'function':<10}{'counter':<26}{'value':>8}")
+        for (function_name, name), value in sorted(recorder.counts.items()):
+            print(f"{function_name:<10}{name:<26}{value:>8}")
+
+    print(f"\n{'backend':<10}{'operation':<34}{'calls':>8}")
+    for backend, fake in backends.items():
+        for operation, calls in sorted(fake.calls.items()):
+            print(f"{backend:<10}{operation:<34}{calls:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="In-process load harness for LF1 and LF2")
+    parser.add_argument('--users', type=int, default=200, help='Users holding a conversation with LF1')
+    parser.add_argument('--returning', type=float, default=0.5,
+                        help='Share of users who greet again and confirm their past suggestions')
+    parser.add_argument('--restaurants', type=int, default=2000, help='Restaurants in the fake catalog')
+    parser.add_argument('--batch-size', type=int, default=10, help='SQS messages per LF2 invocation')
+    parser.add_argument('--lf2-concurrency', type=int, default=1, help='LF2 invocations running at once')
+    parser.add_argument('--latency', action='append', metavar='[SERVICE=]MS',
+                        help=f"Latency injected per call, for every backend or one of {', '.join(SERVICES)}")
+    parser.add_argument('--ses-rate', type=float, default=200, help='SES sends per second allowed')
+    parser.add_argument('--timeout-ms', type=int, default=60000, help='Lambda timeout given to each invocation')
+    parser.add_argument('--candidate-pools', action='store_true',
+                        help='Serve LF2 from a candidate pool artifact instead of search')
+    parser.add_argument('--redeliver', type=float, default=0.0,
+                        help='Share of handled messages SQS delivers a second time')
+    parser.add_argument('--poll', action='store_true',
+                        help='Run LF2 as scheduled drains of the queue instead of event-source batches')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    latencies = parse_latencies(args.latency)
+    catalog = make_catalog(args.restaurants, rng)
+
+    sqs = FakeSQS(latencies['sqs'])
+    dynamodb = FakeDynamoDB(latencies['dynamodb'], keys={'yelp-restaurants': 'business_id'})
+    ses = FakeSES(latencies['ses'], max_send_rate=args.ses_rate)
+    es = FakeElasticsearch({restaurant['business_id']: restaurant['cuisine'] for restaurant in catalog}, latencies['es'])
+    dynamodb.Table('yelp-restaurants').items.update((restaurant['business_id'], restaurant) for restaurant in catalog)
+
+    workdir = tempfile.TemporaryDirectory()
+    os.environ.update({
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        'LOG_LEVEL': 'WARNING',
+        'SENDER_EMAIL': 'foody@example.com',
+        'QUEUE_URL': 'queue',
+        'ES_HOST': es.start(),
+        'SES_MAX_SEND_RATE': str(args.ses_rate),
+    })
+    if args.candidate_pools:
+        # Set before LF2's modules are first imported, which read it at import
+        os.environ['CANDIDATE_POOLS_PATH'] = os.path.join(workdir.name, 'pools.json.gz')
+        sys.path.insert(0, LF2_DIR)
+        from candidate_pools import write_candidate_pools
+
+        pools = {}
+        for restaurant in catalog:
+            pools.setdefault((restaurant['cuisine'], 'manhattan'), []).append(restaurant)
+        write_candidate_pools(pools, os.environ['CANDIDATE_POOLS_PATH'], version='harness')
+        sys.path.remove(LF2_DIR)
+
+    import aws_clients
+    import tracing
+
+    recorder = tracing.metrics = HarnessMetrics(tracing.Metrics)
+    aws_clients.register_client('sqs', sqs)
+    aws_clients.register_client('ses', ses)
+    aws_clients.register_resource('dynamodb', dynamodb)
+
+    lf1 = load_handler(LF1_DIR, 'lf1_lambda_function')
+    lf2 = load_handler(LF2_DIR, 'lf2_lambda_function')
+
+    users = [f"user-{number:05d}" for number in range(args.users)]
+    phases = []
+    try:
+        events = [event for user_id in users for event in conversation(user_id, rng)]
+        started = time.perf_counter()
+        run_lf1(lf1, events, args.timeout_ms)
+        phases.append(('LF1 conversations (events)', len(events), time.perf_counter() - started))
+
+        queued = len(sqs)
+        started = time.perf_counter()
+        processed, dropped = run_lf2(lf2, sqs, args.batch_size, args.lf2_concurrency, args.timeout_ms, args.poll)
+        phases.append(('LF2 queue drain (messages)', processed, time.perf_counter() - started))
+        if dropped or processed != queued:
+            print(f"{queued} queued, {processed} processed, {dropped} dropped after {MAX_RECEIVE_COUNT} receives")
+
+        if args.redeliver:
+            sqs.redeliver(rng.sample(sqs.sent, int(len(sqs.sent) * args.redeliver)))
+            redelivered = len(sqs)
+            started = time.perf_counter()
+            run_lf2(lf2, sqs, args.batch_size, args.lf2_concurrency, args.timeout_ms, args.poll)
+            phases.append(('LF2 redeliveries (messages)', redelivered, time.perf_counter() - started))
+
+        returning = users[:int(len(users) * args.returning)]
+        events = [
+            event for user_id in returning
+            for event in (lex_event(user_id, 'GreetingIntent'),
+                          lex_event(user_id, 'GreetingIntent', confirmation='Confirmed'))
+        ]
+        started = time.perf_counter()
+        run_lf1(lf1, events, args.timeout_ms)
+        phases.append(('LF1 returning greetings (events)', len(events), time.perf_counter() - started))
+    finally:
+        es.stop()
+        workdir.cleanup()
+
+    print_report(phases, recorder, {'sqs': sqs, 'dynamodb': dynamodb, 'ses': ses, 'es': es})
+    print(f"\nEmails sent: {len(ses.sent)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,15 @@
 var checkout = {};
 
+// Identifies this browser's conversation to Lex across page loads
+function getSessionId() {
+  var sessionId = window.localStorage.getItem('chatSessionId');
+  if (!sessionId) {
+    sessionId = 'web-' + Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 12);
+    window.localStorage.setItem('chatSessionId', sessionId);
+  }
+  return sessionId;
+}
+
 $(document).ready(function() {
   var $messages = $('.messages-content'),
     d, h, m,
@@ -31,6 +41,7 @@ $(document).ready(function() {
       messages: [{
         type: 'unstructured',
         unstructured: {
+          id: getSessionId(),
           text: message
         }
       }]
@@ -0,0 +1,89 @@
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger()
+
+# 'off' sends everything to Lex, 'on' answers matched utterances locally and
+# 'shadow' still asks Lex but logs whether the local answer would have agreed
+FAST_PATH_MODE = os.environ.get('FAST_PATH_MODE', 'off').lower()
+
+# Must stay in sync with thankyou_intent in LF1; shadow mode reports drift
+THANK_YOU_MESSAGE = "You’re welcome! Have a nice day."
+
+_PUNCTUATION = re.compile(r"[^\w\s']+")
+_WHITESPACE = re.compile(r'\s+')
+
+# Only whole utterances that can mean nothing but thanks or goodbye are
+# matched. Greetings always go to Lex: LF1 answers them from the user's past
+# suggestions and may start a confirmation. Leading acknowledgements such as
+# "ok thanks" go to Lex too, since they can answer a pending confirmation.
+_THANK_YOU = re.compile(
+    r"(?:(?:thanks|thank you|thank u|thx|ty|cheers)(?: (?:a lot|so much|very much|again))?"
+    r"|bye|goodbye|good bye|see you|see ya)"
+    r"(?: (?:bye|goodbye))?"
+)
+
+# (pattern, intent name, the Lex messages LF1 would return for it)
+ROUTES = (
+    (_THANK_YOU, 'ThankYouIntent', [{'contentType': 'PlainText', 'content': THANK_YOU_MESSAGE}]),
+)
+
+stats = {'hits': 0, 'misses': 0, 'shadow_agreed': 0, 'shadow_disagreed': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        stats[name] += 1
+
+
+def normalize(text):
+    """Lower-cases an utterance and strips punctuation and extra whitespace."""
+    return _WHITESPACE.sub(' ', _PUNCTUATION.sub(' ', text.lower())).strip()
+
+
+def match(text):
+    """
+    Finds the local answer for an utterance.
+
+    Args:
+        text (str): The user's message.
+
+    Returns:
+        tuple: The intent name and the Lex-style messages to answer with, or
+            None if the utterance should go to Lex.
+    """
+    utterance = normalize(text or '')
+    for pattern, intent_name, messages in ROUTES:
+        if pattern.fullmatch(utterance):
+            _count('hits')
+            return intent_name, messages
+
+    _count('misses')
+    return None
+
+
+def compare(local, response):
+    """
+    Records whether Lex answered a matched utterance the way the router would.
+
+    Args:
+        local (tuple): The (intent name, messages) returned by match.
+        response (dict): The recognize_text response for the same utterance.
+    """
+    intent_name = response.get('sessionState', {}).get('intent', {}).get('name')
+    contents = [message.get('content') for message in response.get('messages', [])]
+
+    if intent_name == local[0] and contents == [message['content'] for message in local[1]]:
+        _count('shadow_agreed')
+    else:
+        _count('shadow_disagreed')
+        logger.warning(f"Fast path disagrees with Lex: local {local[0]}, Lex {intent_name} {contents}")
+
+
+def hit_rate():
+    """Returns the share of utterances matched locally so far in this container."""
+    total = stats['hits'] + stats['misses']
+    return stats['hits'] / total if total else 0.0
@@ -1,40 +1,148 @@
 import json
 import logging
-import boto3
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from aws_clients import get_client
+import fast_path
+from tracing import LOG_LEVEL, count, log_payload, stage, traced_handler
 
 logger = logging.getLogger()
-logger.setLevel("INFO")
+logger.setLevel(LOG_LEVEL)
 
-def lambda_handler(event, context):
+# Sessions of different users in one request are sent to Lex in parallel
+LEX_CONCURRENCY = int(os.environ.get('LEX_CONCURRENCY', 8))
+
+# The characters and length Lex accepts for a session ID
+SESSION_ID_PATTERN = re.compile(r'^[0-9a-zA-Z._:-]{2,100}$')
 
-    logger.info(f"Event {event}")
-    message = event['messages'][0]
+def recognize_text(session_id, text):
+    """
+    Sends a message to Lex and returns its response.
 
-    logger.info(f"Context {context}")
+    Args:
+        session_id (str): The Lex session of the user.
+        text (str): The user's message.
 
+    Returns:
+        dict: The recognize_text response.
+    """
     # Lex API call
-    lex = boto3.client('lexv2-runtime')
-    
-    response = lex.recognize_text(
-        botId=os.environ.get('BOT_ID'), 
-        botAliasId=os.environ.get('BOT_ALIAS_ID'),
-        sessionId= '908027408981943',
-        localeId='en_US',  
-        text=message['unstructured']['text']
-    )
+    lex = get_client('lexv2-runtime')
+
+    with stage('lex'):
+        response = lex.recognize_text(
+            botId=os.environ.get('BOT_ID'), 
+            botAliasId=os.environ.get('BOT_ALIAS_ID'),
+            sessionId=session_id,
+            localeId='en_US',  
+            text=text
+        )
     
-    logger.info(response)
+    log_payload("Lex response", response)
+    return response
+
+def answer(session_id, text):
+    """
+    Answers a message locally when the fast path recognizes it, otherwise through Lex.
+
+    Args:
+        session_id (str): The Lex session of the user.
+        text (str): The user's message.
+
+    Returns:
+        list: The Lex-style messages to reply with.
+    """
+    if fast_path.FAST_PATH_MODE == 'off':
+        return recognize_text(session_id, text).get('messages', [])
+
+    local = fast_path.match(text)
+    if local is not None and fast_path.FAST_PATH_MODE == 'on':
+        logger.info(f"Answered {local[0]} without Lex")
+        count('FastPathHits')
+        return local[1]
+
+    response = recognize_text(session_id, text)
+    if local is not None:
+        fast_path.compare(local, response)
+    return response.get('messages', [])
+
+def session_id_of(message, event):
+    """
+    Returns the Lex session ID of the user who sent a message.
+
+    The ID is taken from the message's unstructured.id, or else from a
+    sessionId or userId sent with the whole request.
+
+    Args:
+        message (dict): One message of the request.
+        event (dict): The request.
 
+    Returns:
+        str: The session ID, or None if the request carries no valid one.
+    """
+    session_id = message.get('unstructured', {}).get('id') or event.get('sessionId') or event.get('userId')
+    if session_id is None or not SESSION_ID_PATTERN.match(str(session_id)):
+        return None
+    return str(session_id)
+
+def to_chat_messages(lex_messages):
+    """Converts Lex messages to the message format of the chat API."""
     messages = []
-    for message in response['messages']:
+    for message in lex_messages:
         if message['contentType'] != 'PlainText':
             messages.append({ 'type' : 'structured', 'structured' : { 'text': message['content']}})
 
         else:
             messages.append({ 'type' : 'unstructured', 'unstructured' : { 'text': message['content']}})
+    return messages
+
+def answer_session(session_id, texts):
+    """Answers the messages of one session in the order they were sent."""
+    return [answer(session_id, text) for text in texts]
+
+@traced_handler('LF0')
+def lambda_handler(event, context):
+
+    log_payload("Event", event)
+
+    # Group the messages by session, remembering where each one was in the request
+    sessions = {}
+    for position, message in enumerate(event.get('messages', [])):
+        session_id = session_id_of(message, event)
+        if session_id is None:
+            logger.error(f"Message without a valid session ID: {message}")
+            return {
+                'statusCode': 400,
+                'messages': [],
+                'error': 'Every message needs a session ID in unstructured.id'
+            }
+        sessions.setdefault(session_id, []).append((position, message['unstructured']['text']))
+
+    # Messages of one session must reach Lex in order, different sessions are independent
+    def run(session_id):
+        positions, texts = zip(*sessions[session_id])
+        return zip(positions, answer_session(session_id, texts))
+
+    replies = [None] * sum(map(len, sessions.values()))
+    if len(sessions) <= 1:
+        answered = [run(session_id) for session_id in sessions]
+    else:
+        with ThreadPoolExecutor(max_workers=min(LEX_CONCURRENCY, len(sessions))) as executor:
+            answered = list(executor.map(run, sessions))
+
+    for session_replies in answered:
+        for position, lex_messages in session_replies:
+            replies[position] = lex_messages
+
+    messages = []
+    for lex_messages in replies:
+        messages.extend(to_chat_messages(lex_messages))
+
+    if fast_path.FAST_PATH_MODE != 'off':
+        logger.info(f"Fast path stats: {fast_path.stats}, hit rate {fast_path.hit_rate():.2%}")
     
     return {
         'statusCode': 200,
         'messages': messages
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,104 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from aws_clients import get_table
+from restaurant_cache import fetch_restaurants
+from suggestion_history import history_business_ids, is_compact
+from tracing import stage
+
+logger = logging.getLogger()
+
+PAST_SUGGESTIONS_TABLE = 'past-restaurant-suggestions'
+
+# Greeting lookups are cached per container for a short while, so that a user
+# greeting the bot again does not hit DynamoDB. A new request from the same
+# session drops its entry.
+PAST_SUGGESTIONS_CACHE_TTL_SECONDS = int(os.environ.get('PAST_SUGGESTIONS_CACHE_TTL_SECONDS', 60))
+PAST_SUGGESTIONS_CACHE_MAX_ENTRIES = int(os.environ.get('PAST_SUGGESTIONS_CACHE_MAX_ENTRIES', 1000))
+
+# The greeting only needs to know what the user asked for last time, not the
+# restaurants that were suggested
+PREFERENCE_FIELDS = ['Cuisine', 'Location']
+PREFERENCE_PROJECTION = ', '.join(f"#d.#f{i}" for i in range(len(PREFERENCE_FIELDS)))
+PREFERENCE_NAMES = {'#d': 'dining_details', **{f"#f{i}": field for i, field in enumerate(PREFERENCE_FIELDS)}}
+
+_cache = OrderedDict()
+
+
+def get_past_preferences(user_id):
+    """
+    Returns the cuisine and location of the user's last request.
+
+    Only those two fields are read from DynamoDB. Users without past
+    suggestions are cached as well, since most greetings come from them.
+
+    Args:
+        user_id (str): The Lex session ID the suggestions are stored under.
+
+    Returns:
+        dict: The 'Cuisine' and 'Location' of the last request, or None if the
+            user has no past suggestions.
+    """
+    entry = _cache.get(user_id)
+    if entry is not None:
+        preferences, expires_at = entry
+        if expires_at > time.monotonic():
+            _cache.move_to_end(user_id)
+            return preferences
+        del _cache[user_id]
+
+    with stage('history_read'):
+        response = get_table(PAST_SUGGESTIONS_TABLE).get_item(
+            Key={'user_id': user_id},
+            ProjectionExpression=PREFERENCE_PROJECTION,
+            ExpressionAttributeNames=PREFERENCE_NAMES
+        )
+    preferences = response.get('Item', {}).get('dining_details') or None
+    logger.debug(f"Past preferences of {user_id}: {preferences}")
+
+    _cache[user_id] = (preferences, time.monotonic() + PAST_SUGGESTIONS_CACHE_TTL_SECONDS)
+    if len(_cache) > PAST_SUGGESTIONS_CACHE_MAX_ENTRIES:
+        _cache.popitem(last=False)
+
+    return preferences
+
+
+def load_past_suggestions(user_id):
+    """
+    Reads the user's full past suggestions, once they asked for them by email.
+
+    Items in the compact format only hold business IDs; their details are
+    rebuilt through the cached restaurant lookup. Restaurants that are no
+    longer in the catalog are left out. Items written before the compact
+    format are returned as stored.
+
+    Args:
+        user_id (str): The Lex session ID the suggestions are stored under.
+
+    Returns:
+        dict: The 'restaurants' and 'dining_details', or None if there are none.
+    """
+    with stage('history_read'):
+        item = get_table(PAST_SUGGESTIONS_TABLE).get_item(Key={'user_id': user_id}).get('Item')
+
+    if item is None or not is_compact(item):
+        return item
+
+    business_ids = history_business_ids(item)
+    details = fetch_restaurants(business_ids)
+    restaurants = [
+        {'business_id': business_id, **details[business_id]}
+        for business_id in business_ids if details.get(business_id, {}).get('name')
+    ]
+    if len(restaurants) < len(business_ids):
+        logger.info(f"{len(business_ids) - len(restaurants)} past suggestions of {user_id} are no longer "
+                    f"in the catalog (stored at version {item.get('catalog_version')})")
+
+    return {'dining_details': item['dining_details'], 'restaurants': restaurants}
+
+
+def forget_user(user_id):
+    """Drops the cached lookup of a user whose suggestions are about to change."""
+    _cache.pop(user_id, None)
@@ -0,0 +1,154 @@
+import datetime
+import re
+from collections import namedtuple
+
+from neighborhoods import is_zip_code, neighborhood_center
+
+# Everything below is built once per container, not on every dialog turn.
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+# Lex resolves AMAZON.Time to HH:MM; anything else goes through dateutil
+TIME_PATTERN = re.compile(r'^([01]?\d|2[0-3]):([0-5]\d)$')
+
+VALID_LOCATIONS = frozenset(['manhattan'])
+CUISINE_TYPES = frozenset(['thai', 'indian', 'french', 'italian', 'mexican', 'chinese', 'japanese'])
+
+MIN_PEOPLE = 1
+MAX_PEOPLE = 100
+
+# A dining reservation with every slot parsed to its type. Unfilled slots are None.
+Reservation = namedtuple('Reservation', ['Location', 'Cuisine', 'DiningTime', 'DiningDate', 'NumberOfPeople', 'Email'])
+
+# The first slot that failed validation and the message that asks for it again
+SlotError = namedtuple('SlotError', ['slot', 'message'])
+
+# name: the Lex slot name and Reservation field.
+# parse: turns the interpreted value into its type, raising ValueError if it cannot.
+# invalid: the message used when parse fails.
+# checks: (predicate, message) pairs the parsed value must satisfy, in order.
+Slot = namedtuple('Slot', ['name', 'parse', 'invalid', 'checks'])
+
+
+def _parse_with_dateutil(value):
+    # Imported lazily: the Lex formats are handled without it
+    import dateutil.parser
+
+    try:
+        return dateutil.parser.parse(value)
+    except OverflowError as e:
+        raise ValueError(str(e))
+
+
+def parse_date(value):
+    """Parses a DiningDate value, usually the ISO date Lex resolves it to."""
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        return _parse_with_dateutil(value).date()
+
+
+def parse_time(value):
+    """Parses a DiningTime value, usually the HH:MM time Lex resolves it to."""
+    match = TIME_PATTERN.match(value)
+    if match:
+        return datetime.time(int(match.group(1)), int(match.group(2)))
+    return _parse_with_dateutil(value).time()
+
+
+def is_valid_location(location):
+    """Accepts the borough we serve, one of its neighborhoods or one of its ZIP codes."""
+    return location.lower() in VALID_LOCATIONS or is_zip_code(location) or neighborhood_center(location) is not None
+
+
+def parse_email(value):
+    """Returns the address if it looks like an email, otherwise raises ValueError."""
+    if not EMAIL_PATTERN.match(value):
+        raise ValueError(value)
+    return value
+
+
+SLOT_SCHEMA = (
+    Slot('Location', str, None, (
+        (is_valid_location,
+         "We currently do not support {value} as a valid destination. Manhattan is the hottest spot we serve. Could please enter your preferred location? A Manhattan neighborhood or ZIP code gets you the nearest places."),
+    )),
+    Slot('DiningDate', parse_date, 'I did not understand your date.  When would you like to make reservation?', (
+        (lambda date: date > datetime.date.today(),
+         'Reservations must be scheduled at least one day in advance. Can you try a different date?'),
+    )),
+    Slot('DiningTime', parse_time, 'I did not get your time.  When would you like to make reservation?', ()),
+    Slot('NumberOfPeople', int, 'You can make a reservation for from 1 to 100 person. How many number of people would you like to make reservation for?', (
+        (lambda n_people: MIN_PEOPLE <= n_people <= MAX_PEOPLE,
+         'You can make a reservation for from 1 to 100 person. How many number of people would you like to make reservation for?'),
+    )),
+    Slot('Cuisine', str, None, (
+        (lambda cuisine: cuisine.lower() in CUISINE_TYPES,
+         'Cuisine Type seems to be inaccurate. Would you like to try  cuisine from Thai, Indian, French, Italian, Mexican, Chinese or Japanese?'),
+    )),
+    Slot('Email', parse_email, 'Provided Email is inaccurate. Please check the email and try again.', ()),
+)
+
+
+def interpreted_value(slots, name):
+    """Returns the interpreted value of a Lex slot, or None if it is not filled."""
+    slot = slots.get(name)
+    if not slot:
+        return None
+    return (slot.get('value') or {}).get('interpretedValue')
+
+
+def parse_reservation(slots):
+    """
+    Extracts and validates every slot of the DiningSuggestionsIntent in one pass.
+
+    Slots are checked in SLOT_SCHEMA order and the first invalid one is
+    reported, so Lex asks for one slot at a time.
+
+    Args:
+        slots (dict): The slots of the intent from the Lex session state.
+
+    Returns:
+        tuple: The Reservation, with the slots after an invalid one left
+            unset, and a SlotError or None if every filled slot is valid.
+    """
+    slots = slots or {}
+    values = dict.fromkeys(Reservation._fields)
+
+    for spec in SLOT_SCHEMA:
+        raw = interpreted_value(slots, spec.name)
+        if raw is None:
+            continue
+
+        try:
+            value = spec.parse(raw)
+        except ValueError:
+            return Reservation(**values), SlotError(spec.name, spec.invalid.format(value=raw))
+
+        for predicate, message in spec.checks:
+            if not predicate(value):
+                return Reservation(**values), SlotError(spec.name, message.format(value=raw))
+
+        values[spec.name] = value
+
+    return Reservation(**values), None
+
+
+def reservation_message(reservation, user_id):
+    """
+    Builds the SQS message body for a reservation.
+
+    Args:
+        reservation (Reservation): The validated reservation.
+        user_id (str): The Lex session ID the suggestions are stored under.
+
+    Returns:
+        dict: The dining details LF2 expects.
+    """
+    message = {'ReservationType': 'Dining'}
+    message.update(reservation._asdict())
+    if reservation.DiningDate is not None:
+        message['DiningDate'] = reservation.DiningDate.isoformat()
+    if reservation.DiningTime is not None:
+        message['DiningTime'] = reservation.DiningTime.strftime('%H:%M')
+    message['user_id'] = user_id
+    return message
@@ -0,0 +1,134 @@
+import gzip
+import json
+import logging
+import os
+import time
+from decimal import Decimal
+
+from snapshot import RefreshingSnapshot, parse_s3_uri, s3_download
+
+logger = logging.getLogger()
+
+# A local artifact bundled with the deployment package, or an s3://bucket/prefix
+# URI. In S3 every version is stored as pools-<version>.json.gz next to a
+# CURRENT object that names the active version, so a rollout is a single write.
+CANDIDATE_POOLS_PATH = os.environ.get('CANDIDATE_POOLS_PATH')
+CANDIDATE_POOLS_S3_URI = os.environ.get('CANDIDATE_POOLS_S3_URI')
+
+# How often the CURRENT pointer is checked for a new version
+CANDIDATE_POOLS_TTL_SECONDS = int(os.environ.get('CANDIDATE_POOLS_TTL_SECONDS', 300))
+
+FORMAT_VERSION = 1
+
+# Fields denormalized into every pool entry: the email columns plus what the
+# pools are ranked by
+POOL_FIELDS = ['business_id', 'name', 'address', 'rating', 'review_count', 'reviews']
+
+
+def pool_key(cuisine, location):
+    """Returns the key of the pool for a (cuisine, location) preference."""
+    return f"{cuisine.lower()}|{(location or '').lower()}"
+
+
+def rank_restaurants(restaurants):
+    """Orders restaurants by rating, then by number of reviews, best first."""
+    return sorted(
+        restaurants,
+        key=lambda restaurant: (float(restaurant.get('rating') or 0), int(restaurant.get('review_count') or 0)),
+        reverse=True
+    )
+
+
+def _json_default(obj):
+    """Serializes the Decimal values that DynamoDB returns as numbers."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return str(obj)
+
+
+def write_candidate_pools(pools, path, version=None, max_pool_size=None):
+    """
+    Writes a versioned, gzip-compressed candidate pool artifact.
+
+    Args:
+        pools (dict): Restaurant records keyed by (cuisine, location).
+        path (str): The file to write.
+        version (str): The artifact version. Defaults to the current timestamp.
+        max_pool_size (int): If set, only the best ranked restaurants are kept.
+
+    Returns:
+        str: The version written to the artifact.
+    """
+    version = version or time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+    artifact = {
+        'format': FORMAT_VERSION,
+        'version': version,
+        'pools': {
+            pool_key(cuisine, location): [
+                {field: restaurant[field] for field in POOL_FIELDS if field in restaurant}
+                for restaurant in rank_restaurants(restaurants)[:max_pool_size]
+            ]
+            for (cuisine, location), restaurants in pools.items()
+        }
+    }
+
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(artifact, f, default=_json_default)
+    os.replace(tmp_path, path)
+
+    return version
+
+
+class CandidatePools:
+    """A loaded candidate pool artifact."""
+
+    def __init__(self, path, key=None):
+        self.path = path
+        self.key = key
+
+        # Numbers are loaded as Decimal so records can be written back to DynamoDB
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            artifact = json.load(f, parse_float=Decimal)
+
+        if artifact.get('format') != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a candidate pool artifact")
+
+        self.version = artifact['version']
+        self.pools = artifact['pools']
+
+    def pool(self, cuisine, location):
+        """Returns the ranked pool for the preference, or None if there is none."""
+        return self.pools.get(pool_key(cuisine, location))
+
+
+def _load(current):
+    """Loads the active artifact, or returns None if the current one is up to date."""
+    if CANDIDATE_POOLS_S3_URI:
+        from aws_clients import get_client
+
+        bucket, prefix = parse_s3_uri(CANDIDATE_POOLS_S3_URI.rstrip('/'))
+        pointer = get_client('s3').get_object(Bucket=bucket, Key='/'.join(filter(None, [prefix, 'CURRENT'])))
+        key = '/'.join(filter(None, [prefix, pointer['Body'].read().decode('utf-8').strip()]))
+        if current is not None and current.key == key:
+            return None
+
+        path = s3_download(bucket, key, 'candidate-pools-')
+        try:
+            return CandidatePools(path, key)
+        finally:
+            os.remove(path)
+
+    if current is None:
+        return CandidatePools(CANDIDATE_POOLS_PATH)
+    return None
+
+
+_snapshot = RefreshingSnapshot('candidate pools', _load, CANDIDATE_POOLS_TTL_SECONDS)
+
+
+def get_candidate_pools():
+    """Returns the active candidate pool artifact, or None if none is configured."""
+    if not (CANDIDATE_POOLS_PATH or CANDIDATE_POOLS_S3_URI):
+        return None
+    return _snapshot.get()
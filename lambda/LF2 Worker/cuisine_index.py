@@ -0,0 +1,154 @@
+import json
+import logging
+import mmap
+import os
+import random
+import re
+import struct
+import time
+
+from snapshot import RefreshingSnapshot, parse_s3_uri, s3_download
+
+logger = logging.getLogger()
+
+# Local snapshot bundled with the deployment package, or an s3://bucket/key URI
+# that is downloaded to /tmp at cold start and refreshed when its ETag changes.
+CUISINE_INDEX_PATH = os.environ.get('CUISINE_INDEX_PATH')
+CUISINE_INDEX_S3_URI = os.environ.get('CUISINE_INDEX_S3_URI')
+
+# How often the snapshot source is checked for a new version
+CUISINE_INDEX_TTL_SECONDS = int(os.environ.get('CUISINE_INDEX_TTL_SECONDS', 300))
+
+# File layout: MAGIC, format version (uint16), ID width (uint16), header length
+# (uint32), JSON header, then every business ID padded to a fixed width.
+MAGIC = b'CIDX'
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct('<4sHHI')
+
+
+def cuisine_tokens(title):
+    """
+    Splits a cuisine title into lowercase tokens.
+
+    Indexing every token mirrors the Elasticsearch match query, where 'Italian'
+    also matches restaurants categorised as 'Northern Italian'.
+    """
+    return re.findall(r'[a-z0-9]+', title.lower())
+
+
+def write_snapshot(restaurants, path, version=None):
+    """
+    Writes a cuisine -> business ID index snapshot.
+
+    Args:
+        restaurants (iterable): (cuisine title, business ID) pairs, e.g. the
+            'Cuisine' and 'RestaurantID' fields indexed in OpenSearch.
+        path (str): The file to write.
+        version (str): The snapshot version. Defaults to the current timestamp.
+
+    Returns:
+        str: The version written to the snapshot.
+    """
+    postings = {}
+    for title, business_id in restaurants:
+        for token in cuisine_tokens(title):
+            postings.setdefault(token, set()).add(business_id)
+
+    id_width = max((len(business_id) for ids in postings.values() for business_id in ids), default=0)
+    version = version or time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+
+    cuisines = {}
+    body = bytearray()
+    for token in sorted(postings):
+        ids = sorted(postings[token])
+        cuisines[token] = [len(body) // max(id_width, 1), len(ids)]
+        for business_id in ids:
+            body += business_id.encode('ascii').ljust(id_width, b'\0')
+
+    header = json.dumps({'version': version, 'cuisines': cuisines}).encode('utf-8')
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, id_width, len(header)))
+        f.write(header)
+        f.write(body)
+    os.replace(tmp_path, path)
+
+    return version
+
+
+class CuisineIndex:
+    """A read-only, memory-mapped cuisine -> business ID index snapshot."""
+
+    def __init__(self, path):
+        self.path = path
+        self.etag = None
+        self.temporary = False
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, format_version, self.id_width, header_length = PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a cuisine index snapshot")
+
+        header = json.loads(self._mmap[PREAMBLE.size:PREAMBLE.size + header_length])
+        self.version = header['version']
+        self.cuisines = header['cuisines']
+        self._offset = PREAMBLE.size + header_length
+
+    def __contains__(self, cuisine):
+        return cuisine.lower() in self.cuisines
+
+    def _id_at(self, position):
+        start = self._offset + position * self.id_width
+        return self._mmap[start:start + self.id_width].rstrip(b'\0').decode('ascii')
+
+    def ids(self, cuisine):
+        """Returns every business ID indexed under the cuisine."""
+        start, count = self.cuisines.get(cuisine.lower(), (0, 0))
+        return [self._id_at(position) for position in range(start, start + count)]
+
+    def sample(self, cuisine, k):
+        """
+        Returns up to k distinct random business IDs for the cuisine.
+
+        Only the selected IDs are read from the memory map.
+        """
+        start, count = self.cuisines.get(cuisine.lower(), (0, 0))
+        positions = random.sample(range(start, start + count), k=min(k, count))
+        return [self._id_at(position) for position in positions]
+
+
+def _load(current):
+    """Loads the configured snapshot, or returns None if the current one is up to date."""
+    if CUISINE_INDEX_S3_URI:
+        from aws_clients import get_client
+
+        bucket, key = parse_s3_uri(CUISINE_INDEX_S3_URI)
+        etag = get_client('s3').head_object(Bucket=bucket, Key=key)['ETag']
+        if current is not None and current.etag == etag:
+            return None
+
+        index = CuisineIndex(s3_download(bucket, key, 'cuisine-index-'))
+        index.etag = etag
+        index.temporary = True
+        return index
+
+    if current is None:
+        return CuisineIndex(CUISINE_INDEX_PATH)
+    return None
+
+
+_snapshot = RefreshingSnapshot('cuisine index', _load, CUISINE_INDEX_TTL_SECONDS)
+
+
+def get_cuisine_index():
+    """
+    Returns the current cuisine index snapshot, or None if none is configured.
+
+    The snapshot is refreshed in the background once CUISINE_INDEX_TTL_SECONDS
+    have passed; see RefreshingSnapshot.
+    """
+    if not (CUISINE_INDEX_PATH or CUISINE_INDEX_S3_URI):
+        return None
+    return _snapshot.get()
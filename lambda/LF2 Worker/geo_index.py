@@ -0,0 +1,314 @@
+import gzip
+import heapq
+import json
+import logging
+import math
+import os
+import time
+from array import array
+from collections import namedtuple
+
+from cuisine_index import cuisine_tokens
+from neighborhoods import is_zip_code, neighborhood_center
+from snapshot import RefreshingSnapshot, parse_s3_uri, s3_download
+
+logger = logging.getLogger()
+
+# A local snapshot bundled with the deployment package, or an s3://bucket/key
+# URI that is downloaded at cold start and reloaded when its ETag changes.
+GEO_INDEX_PATH = os.environ.get('GEO_INDEX_PATH')
+GEO_INDEX_S3_URI = os.environ.get('GEO_INDEX_S3_URI')
+
+# How often the snapshot source is checked for a new version
+GEO_INDEX_TTL_SECONDS = int(os.environ.get('GEO_INDEX_TTL_SECONDS', 300))
+
+# Requests for a neighborhood or ZIP code only get restaurants this close
+GEO_MAX_DISTANCE_KM = float(os.environ.get('GEO_MAX_DISTANCE_KM', 3))
+
+FORMAT_VERSION = 1
+
+# Grid cells are sized per cuisine to hold about this many restaurants each,
+# so query cost stays flat as the catalog gets denser
+TARGET_PER_CELL = 8
+MIN_CELL_DEGREES = 0.0005
+MAX_CELL_DEGREES = 0.05
+
+KM_PER_DEGREE = 111.32
+
+
+def write_geo_index(restaurants, path, version=None):
+    """
+    Writes a versioned, gzip-compressed geo index snapshot.
+
+    Args:
+        restaurants (iterable): (cuisine title, business ID, latitude, longitude,
+            ZIP code) tuples, e.g. from the 'coordinates' and 'zip_code' fields
+            stored in yelp-restaurants. Restaurants without coordinates are skipped.
+        path (str): The file to write.
+        version (str): The snapshot version. Defaults to the current timestamp.
+
+    Returns:
+        str: The version written to the snapshot.
+    """
+    entries = {}
+    for title, business_id, latitude, longitude, zip_code in restaurants:
+        if latitude is None or longitude is None:
+            continue
+        entry = entries.setdefault(business_id, (float(latitude), float(longitude), zip_code or '', set()))
+        entry[3].update(cuisine_tokens(title))
+
+    ids = sorted(entries)
+    cuisines = {}
+    for position, business_id in enumerate(ids):
+        for token in entries[business_id][3]:
+            cuisines.setdefault(token, []).append(position)
+
+    version = version or time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+    snapshot = {
+        'format': FORMAT_VERSION,
+        'version': version,
+        'ids': ids,
+        'latitudes': [entries[business_id][0] for business_id in ids],
+        'longitudes': [entries[business_id][1] for business_id in ids],
+        'zip_codes': [entries[business_id][2] for business_id in ids],
+        'cuisines': cuisines,
+    }
+
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(snapshot, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+    return version
+
+
+# One cuisine's grid: the cell side in degrees, {(row, column): [positions]},
+# and the (min row, max row, min column, max column) of its occupied cells
+Grid = namedtuple('Grid', ['cell_degrees', 'cells', 'bounds'])
+
+
+class GeoIndex:
+    """
+    A grid of restaurant locations per cuisine, for nearest and radius queries.
+
+    Each cuisine's restaurants are bucketed into square cells sized so that a
+    cell holds about TARGET_PER_CELL of them. A query only visits the cells
+    around the point, so its cost depends on how many restaurants are nearby,
+    not on the catalog size. Distances use the equirectangular approximation,
+    which is accurate to well under 1% at city scale.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.etag = None
+
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            snapshot = json.load(f)
+
+        if snapshot.get('format') != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a geo index snapshot")
+
+        self.version = snapshot['version']
+        self.ids = snapshot['ids']
+        self._latitudes = array('d', snapshot['latitudes'])
+        self._longitudes = array('d', snapshot['longitudes'])
+        self._grids = {token: self._build_grid(positions) for token, positions in snapshot['cuisines'].items()}
+
+        # The center of a ZIP code is the mean location of its restaurants
+        zip_sums = {}
+        for zip_code, latitude, longitude in zip(snapshot['zip_codes'], self._latitudes, self._longitudes):
+            if zip_code:
+                sums = zip_sums.setdefault(zip_code, [0.0, 0.0, 0])
+                sums[0] += latitude
+                sums[1] += longitude
+                sums[2] += 1
+        self.zip_centers = {zip_code: (lat / n, lon / n) for zip_code, (lat, lon, n) in zip_sums.items()}
+
+    def _build_grid(self, positions):
+        latitudes = [self._latitudes[position] for position in positions]
+        longitudes = [self._longitudes[position] for position in positions]
+        area = max(max(latitudes) - min(latitudes), MIN_CELL_DEGREES) * max(max(longitudes) - min(longitudes), MIN_CELL_DEGREES)
+        cell_degrees = min(MAX_CELL_DEGREES, max(MIN_CELL_DEGREES, math.sqrt(area * TARGET_PER_CELL / len(positions))))
+
+        cells = {}
+        for position, latitude, longitude in zip(positions, latitudes, longitudes):
+            cells.setdefault(_cell(latitude, longitude, cell_degrees), []).append(position)
+
+        rows = [row for row, _ in cells]
+        columns = [column for _, column in cells]
+        return Grid(cell_degrees, cells, (min(rows), max(rows), min(columns), max(columns)))
+
+    def __contains__(self, cuisine):
+        return cuisine.lower() in self._grids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _distance_km(self, position, latitude, longitude, longitude_scale):
+        return math.hypot(
+            (self._latitudes[position] - latitude) * KM_PER_DEGREE,
+            (self._longitudes[position] - longitude) * longitude_scale
+        )
+
+    def resolve(self, location):
+        """
+        Returns the (latitude, longitude) a location stands for, or None.
+
+        Args:
+            location (str): A ZIP code or a neighborhood name. A whole borough
+                such as 'Manhattan' has no single point and resolves to None.
+        """
+        if not location:
+            return None
+        if is_zip_code(location):
+            return self.zip_centers.get(location.strip())
+        return neighborhood_center(location)
+
+    def nearest(self, cuisine, latitude, longitude, k, max_km=None):
+        """
+        Returns the k restaurants of a cuisine nearest to a point.
+
+        Cells are visited in rings around the point's cell, and the search
+        stops once no cell further out can hold anything closer than the k-th
+        restaurant found.
+
+        Args:
+            cuisine (str): The cuisine.
+            latitude (float): The latitude of the point.
+            longitude (float): The longitude of the point.
+            k (int): The number of restaurants wanted.
+            max_km (float): If set, restaurants further away are left out.
+
+        Returns:
+            list: (business ID, distance in km) pairs, nearest first.
+        """
+        grid = self._grids.get(cuisine.lower())
+        if grid is None or k <= 0:
+            return []
+
+        cells = grid.cells
+        row, column = _cell(latitude, longitude, grid.cell_degrees)
+        longitude_scale = KM_PER_DEGREE * math.cos(math.radians(latitude))
+        cell_km = grid.cell_degrees * min(KM_PER_DEGREE, longitude_scale)
+        min_row, max_row, min_column, max_column = grid.bounds
+        last_ring = max(abs(row - min_row), abs(row - max_row), abs(column - min_column), abs(column - max_column))
+
+        # Squared distances are compared in degree units scaled to latitude,
+        # which keeps the inner loop to a few float operations
+        latitudes, longitudes = self._latitudes, self._longitudes
+        aspect = longitude_scale / KM_PER_DEGREE
+        limit = math.inf if max_km is None else (max_km / KM_PER_DEGREE) ** 2
+
+        # A max-heap of the k nearest so far, as (-squared distance, position)
+        heap = []
+        for ring in range(last_ring + 1):
+            # Every cell of this ring is at least (ring - 1) whole cells away
+            closest_possible = (max(0, ring - 1) * cell_km / KM_PER_DEGREE) ** 2
+            if closest_possible > limit:
+                break
+            if len(heap) == k and closest_possible > -heap[0][0]:
+                break
+
+            for cell in _ring_cells(row, column, ring):
+                for position in cells.get(cell, ()):
+                    d_lat = latitudes[position] - latitude
+                    d_lon = (longitudes[position] - longitude) * aspect
+                    squared = d_lat * d_lat + d_lon * d_lon
+                    if squared > limit:
+                        continue
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-squared, position))
+                    elif squared < -heap[0][0]:
+                        heapq.heapreplace(heap, (-squared, position))
+
+        return [(self.ids[position], math.sqrt(-negative) * KM_PER_DEGREE)
+                for negative, position in sorted(heap, reverse=True)]
+
+    def within(self, cuisine, latitude, longitude, radius_km):
+        """
+        Returns every restaurant of a cuisine within a radius of a point.
+
+        Returns:
+            list: (business ID, distance in km) pairs, nearest first.
+        """
+        grid = self._grids.get(cuisine.lower())
+        if grid is None:
+            return []
+
+        cells = grid.cells
+        row, column = _cell(latitude, longitude, grid.cell_degrees)
+        longitude_scale = KM_PER_DEGREE * math.cos(math.radians(latitude))
+        rows = math.ceil(radius_km / (grid.cell_degrees * KM_PER_DEGREE))
+        columns = math.ceil(radius_km / (grid.cell_degrees * longitude_scale))
+
+        if (2 * rows + 1) * (2 * columns + 1) > len(cells):
+            candidates = (
+                positions for (cell_row, cell_column), positions in cells.items()
+                if abs(cell_row - row) <= rows and abs(cell_column - column) <= columns
+            )
+        else:
+            candidates = (
+                cells.get((cell_row, cell_column), ())
+                for cell_row in range(row - rows, row + rows + 1)
+                for cell_column in range(column - columns, column + columns + 1)
+            )
+
+        found = []
+        for positions in candidates:
+            for position in positions:
+                distance = self._distance_km(position, latitude, longitude, longitude_scale)
+                if distance <= radius_km:
+                    found.append((distance, position))
+
+        found.sort()
+        return [(self.ids[position], distance) for distance, position in found]
+
+
+def _cell(latitude, longitude, cell_degrees):
+    return (math.floor(latitude / cell_degrees), math.floor(longitude / cell_degrees))
+
+
+def _ring_cells(row, column, ring):
+    """Yields the cells at Chebyshev distance ring from (row, column)."""
+    if ring == 0:
+        yield (row, column)
+        return
+    for offset in range(-ring, ring + 1):
+        yield (row - ring, column + offset)
+        yield (row + ring, column + offset)
+    for offset in range(-ring + 1, ring):
+        yield (row + offset, column - ring)
+        yield (row + offset, column + ring)
+
+
+def _load(current):
+    """Loads the configured snapshot, or returns None if the current one is up to date."""
+    if GEO_INDEX_S3_URI:
+        from aws_clients import get_client
+
+        bucket, key = parse_s3_uri(GEO_INDEX_S3_URI)
+        etag = get_client('s3').head_object(Bucket=bucket, Key=key)['ETag']
+        if current is not None and current.etag == etag:
+            return None
+
+        path = s3_download(bucket, key, 'geo-index-')
+        try:
+            index = GeoIndex(path)
+        finally:
+            os.remove(path)
+        index.etag = etag
+        return index
+
+    if current is None:
+        return GeoIndex(GEO_INDEX_PATH)
+    return None
+
+
+_snapshot = RefreshingSnapshot('geo index', _load, GEO_INDEX_TTL_SECONDS)
+
+
+def get_geo_index():
+    """Returns the current geo index snapshot, or None if none is configured."""
+    if not (GEO_INDEX_PATH or GEO_INDEX_S3_URI):
+        return None
+    return _snapshot.get()
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from aws_clients import get_table
+
+logger = logging.getLogger()
+
+# DynamoDB table with partition key 'idempotency_key' and TTL on 'expires_at'.
+# Without it, duplicates are only caught by the in-container cache.
+IDEMPOTENCY_TABLE = os.environ.get('IDEMPOTENCY_TABLE')
+
+# 'message_id' catches SQS redeliveries; 'content' also catches the same
+# dining request queued twice under different message IDs
+IDEMPOTENCY_KEY = os.environ.get('IDEMPOTENCY_KEY', 'message_id')
+
+# How long a completed message is remembered
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 24 * 3600))
+
+# How long a claim blocks other workers when no invocation deadline is known
+IDEMPOTENCY_LEASE_SECONDS = int(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', 900))
+
+IDEMPOTENCY_CACHE_MAX_ENTRIES = int(os.environ.get('IDEMPOTENCY_CACHE_MAX_ENTRIES', 10000))
+
+# Outcomes of claim()
+CLAIMED = 'CLAIMED'
+COMPLETED = 'COMPLETED'
+IN_PROGRESS = 'IN_PROGRESS'
+
+# Identifies this container's claims, so that it only releases its own
+OWNER = uuid.uuid4().hex
+
+_completed = OrderedDict()
+_completed_lock = threading.Lock()
+
+
+def idempotency_key(message_id, dining_details):
+    """
+    Returns the key a message is deduplicated on.
+
+    Args:
+        message_id (str): The SQS message ID.
+        dining_details (dict): The parsed message body.
+
+    Returns:
+        str: The message ID, or a hash of the canonical body in 'content' mode.
+    """
+    if IDEMPOTENCY_KEY == 'content':
+        body = json.dumps(dining_details, sort_keys=True, separators=(',', ':'), default=str)
+        return 'sha256:' + hashlib.sha256(body.encode()).hexdigest()
+    return 'msg:' + message_id
+
+
+def _remember(key, expires_at):
+    with _completed_lock:
+        _completed[key] = expires_at
+        _completed.move_to_end(key)
+        if len(_completed) > IDEMPOTENCY_CACHE_MAX_ENTRIES:
+            _completed.popitem(last=False)
+
+
+def _seen(key):
+    with _completed_lock:
+        expires_at = _completed.get(key)
+        if expires_at is None:
+            return False
+        if expires_at <= time.time():
+            del _completed[key]
+            return False
+        return True
+
+
+def claim(key, lease_seconds=None):
+    """
+    Claims a message for processing unless it was already handled.
+
+    The in-container cache is checked first. The claim itself is a conditional
+    put that only succeeds if the key is new, its record expired, or another
+    worker's claim has lapsed. If the store fails, the message is processed
+    anyway: a rare duplicate email is preferred to a stuck queue.
+
+    Args:
+        key (str): The idempotency key.
+        lease_seconds (float): How long the claim blocks other workers.
+
+    Returns:
+        str: CLAIMED, COMPLETED (skip it) or IN_PROGRESS (another worker has it).
+    """
+    if _seen(key):
+        return COMPLETED
+
+    if not IDEMPOTENCY_TABLE:
+        return CLAIMED
+
+    from botocore.exceptions import ClientError
+
+    now = int(time.time())
+    lease_expires_at = now + int(lease_seconds or IDEMPOTENCY_LEASE_SECONDS)
+    try:
+        get_table(IDEMPOTENCY_TABLE).put_item(
+            Item={
+                'idempotency_key': key,
+                'status': IN_PROGRESS,
+                'owner': OWNER,
+                'lease_expires_at': lease_expires_at,
+                'expires_at': lease_expires_at,
+            },
+            ConditionExpression=(
+                'attribute_not_exists(idempotency_key) OR expires_at < :now '
+                'OR (#status = :in_progress AND lease_expires_at < :now)'
+            ),
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':now': now, ':in_progress': IN_PROGRESS},
+        )
+        return CLAIMED
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            logger.error(f"Idempotency claim failed for {key}, processing anyway: {e}")
+            return CLAIMED
+
+    record = get_table(IDEMPOTENCY_TABLE).get_item(Key={'idempotency_key': key}, ConsistentRead=True).get('Item', {})
+    if record.get('status') == COMPLETED:
+        _remember(key, int(record.get('expires_at', now + IDEMPOTENCY_TTL_SECONDS)))
+        return COMPLETED
+    return IN_PROGRESS
+
+
+def complete(key):
+    """Records that a message was handled, so that redeliveries are skipped."""
+    expires_at = int(time.time()) + IDEMPOTENCY_TTL_SECONDS
+    _remember(key, expires_at)
+
+    if IDEMPOTENCY_TABLE:
+        get_table(IDEMPOTENCY_TABLE).put_item(Item={
+            'idempotency_key': key,
+            'status': COMPLETED,
+            'owner': OWNER,
+            'expires_at': expires_at,
+        })
+
+
+def release(key):
+    """Drops this container's claim on a message that failed, so a retry can take it."""
+    if not IDEMPOTENCY_TABLE:
+        return
+
+    from botocore.exceptions import ClientError
+
+    try:
+        get_table(IDEMPOTENCY_TABLE).delete_item(
+            Key={'idempotency_key': key},
+            ConditionExpression='#owner = :owner AND #status = :in_progress',
+            ExpressionAttributeNames={'#owner': 'owner', '#status': 'status'},
+            ExpressionAttributeValues={':owner': OWNER, ':in_progress': IN_PROGRESS},
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
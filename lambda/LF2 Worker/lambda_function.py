@@ -1,19 +1,60 @@
 import json
-import boto3
 import logging
 import os
-import requests
-import random
-from utils import *
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from aws_clients import get_client, get_table
+from email_render import render_batch
+from idempotency import COMPLETED, CLAIMED, IN_PROGRESS, claim, complete, idempotency_key, release
+from restaurant_cache import fetch_restaurants, restaurant_cache
+from search import catalog_version, draw_suggestions, find_candidate_pool
+from seen_filter import SEEN_FILTER_ENABLED, SeenFilter, load_seen_filter
+from ses_sender import send_bulk_email
+from suggestion_history import encode_history
+from tracing import LOG_LEVEL, count, log_payload, traced, traced_handler
+from visibility import VisibilityHeartbeat
 
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+logger.setLevel(LOG_LEVEL)
 
+# Number of messages processed in parallel within one batch
+WORKER_CONCURRENCY = int(os.environ.get('WORKER_CONCURRENCY', 10))
+
+# Stop starting new messages once less than this much time is left
+DEADLINE_MARGIN_MS = int(os.environ.get('DEADLINE_MARGIN_MS', 5000))
+
+# Scheduled polling keeps receiving batches until the queue is empty or the
+# deadline is near; 'false' restores a single receive per invocation
+DRAIN_QUEUE = os.environ.get('DRAIN_QUEUE', 'true').lower() == 'true'
+
+# Receive calls of up to 10 messages each that make up one drained batch
+DRAIN_MAX_RECEIVES = int(os.environ.get('DRAIN_MAX_RECEIVES', 5))
+
+# Long-poll wait used while the queue is running low (at most 20)
+SQS_WAIT_TIME_SECONDS = min(20, int(os.environ.get('SQS_WAIT_TIME_SECONDS', 10)))
+
+# Visibility of received messages; it is extended while a batch is still running
+SQS_VISIBILITY_TIMEOUT = int(os.environ.get('SQS_VISIBILITY_TIMEOUT', 40))
+
+# receive_message returns at most 10 messages per call
+SQS_MAX_MESSAGES = 10
+
+# Shared by every batch so that warm invocations reuse the worker threads and
+# the per-thread DynamoDB resources they hold. Threads start on first use.
+executor = ThreadPoolExecutor(max_workers=max(1, WORKER_CONCURRENCY), thread_name_prefix='lf2-worker')
+
+@traced_handler('LF2')
 def lambda_handler(event, context):
     """
     Lambda function to process messages from SQS and send restaurant
     suggestions to users via SES.
 
+    The function supports two entry modes:
+        - SQS event source mapping: the event carries the batch in 'Records' and
+          the response reports only the failed records in 'batchItemFailures'.
+        - Scheduled polling (EventBridge): the function drains the queue itself,
+          batch by batch, deleting the successfully processed messages.
+
     Args:
         event (dict): Event data passed to the Lambda function.
         context (Context): Context object containing information about the
@@ -22,204 +63,537 @@ def lambda_handler(event, context):
     Returns:
         dict: A dictionary containing the response to the invocation.
     """
-    logger.info(event)
+    log_payload("Event", event)
 
-    result = sqs_receive_message()
-    logger.info(f"SQS receive_message: {result}")
+    if is_sqs_event(event):
+        return handle_sqs_event(event, context)
 
-    if 'Messages' not in result:
+    return handle_scheduled_poll(context)
+
+
+def is_sqs_event(event):
+    """Checks whether the event was delivered by an SQS event source mapping."""
+    records = event.get('Records') if isinstance(event, dict) else None
+    return bool(records) and records[0].get('eventSource') == 'aws:sqs'
+
+
+def handle_sqs_event(event, context):
+    """
+    Processes a batch delivered by an SQS event source mapping.
+
+    Successful records are deleted by Lambda itself; failed records are
+    reported back so that only they become visible again.
+
+    Args:
+        event (dict): The SQS event containing 'Records'.
+        context (Context): The Lambda context, used for the deadline.
+
+    Returns:
+        dict: A partial batch response with the failed message IDs.
+    """
+    messages = {record['messageId']: record['body'] for record in event['Records']}
+    failed_ids = process_batch(messages, context)
+    count('MessagesProcessed', len(messages) - len(failed_ids))
+    count('MessagesFailed', len(failed_ids))
+    logger.info(f"Restaurant cache: {restaurant_cache.stats()}")
+
+    return {
+        'batchItemFailures': [
+            {'itemIdentifier': message_id} for message_id in messages if message_id in failed_ids
+        ]
+    }
+
+
+def handle_scheduled_poll(context):
+    """
+    Drains the SQS queue batch by batch until it is empty or the deadline is near.
+
+    The batch size and the long-poll wait follow the observed queue depth:
+    while receives come back full, the next batch grows (up to
+    DRAIN_MAX_RECEIVES receive calls) and is fetched without waiting; once
+    the queue runs low, batches shrink and the receive long-polls. The loop
+    stops when a long poll finds nothing, or when what is left of the
+    invocation would not fit the wait plus the slowest batch seen so far.
+
+    Received messages are kept invisible while their batch is processed, and
+    each batch is deleted before the next one is received. Messages that fail
+    are left in the queue so that they are retried once their visibility
+    timeout expires.
+
+    Args:
+        context (Context): The Lambda context, used for the deadline.
+
+    Returns:
+        dict: A dictionary containing the response to the invocation.
+    """
+    # Without a deadline the loop could not know when to stop
+    drain = DRAIN_QUEUE and remaining_time_ms(context) is not None
+    receives = 1
+    wait_seconds = SQS_WAIT_TIME_SECONDS
+    slowest_batch_ms = 0
+    confirming = False
+    batches = processed_total = failed_total = 0
+
+    while True:
+        remaining = remaining_time_ms(context)
+        if remaining is not None:
+            budget_ms = remaining - DEADLINE_MARGIN_MS - slowest_batch_ms
+            if budget_ms <= 0:
+                logger.info(f"Stopping the drain with {remaining} ms left")
+                break
+            # Leave at least half of the budget for processing what arrives.
+            # botocore rejects a float wait, and the batch timings are floats.
+            wait_seconds = min(wait_seconds, int(budget_ms // 2000))
+
+        messages = receive_batch(receives, wait_seconds)
+        if not messages:
+            if not drain or wait_seconds or confirming:
+                break
+            # A short poll can miss messages; confirm the queue is empty with a long poll
+            confirming = True
+            receives, wait_seconds = 1, SQS_WAIT_TIME_SECONDS
+            continue
+        confirming = False
+
+        started = time.monotonic()
+        with VisibilityHeartbeat(os.environ.get('QUEUE_URL'), messages, SQS_VISIBILITY_TIMEOUT):
+            failed_ids = process_batch({message['MessageId']: message['Body'] for message in messages}, context)
+        processed = [message for message in messages if message['MessageId'] not in failed_ids]
+
+        # Delete only the messages that were processed successfully
+        if processed:
+            sqs_delete_message_batch(processed)
+
+        slowest_batch_ms = max(slowest_batch_ms, (time.monotonic() - started) * 1000)
+        batches += 1
+        processed_total += len(processed)
+        failed_total += len(failed_ids)
+
+        if not drain:
+            break
+
+        if len(messages) == receives * SQS_MAX_MESSAGES:
+            # A backlog: grow the batch and skip the wait
+            receives, wait_seconds = min(DRAIN_MAX_RECEIVES, receives * 2), 0
+        else:
+            receives, wait_seconds = 1, SQS_WAIT_TIME_SECONDS
+
+    count('DrainBatches', batches)
+    count('MessagesProcessed', processed_total)
+    count('MessagesFailed', failed_total)
+    logger.info(f"Restaurant cache: {restaurant_cache.stats()}")
+
+    if not batches:
         return {
             'statusCode': 200,
             'body': json.dumps('No messages in the queue')
         }
 
-    for message in result['Messages']:
-        try:
-            dining_details = json.loads(message['Body'])
-            receipt_handle = message['ReceiptHandle']
-
-            # Get list from elastic search
-            cuisine = dining_details['Cuisine']
-            host = os.getenv('ES_HOST')
-            url = f"{host}/_search"
-            query = {
-                "query": {
-                    "match": {
-                        "Cuisine": {
-                            "query": cuisine.capitalize(),
-                            "operator": "and"
-                        }
-                    }
-                },
-                "size": 1000
-            }
-            headers = {"Content-Type": "application/json"}
-
-            # Make the Elasticsearch request
-            es_response = requests.get(
-                url, headers=headers, data=json.dumps(query),
-                auth=(os.getenv('ES_USERNAME'), os.getenv('ES_PASSWORD'))
-            )
-
-            logger.info(f"Elasticsearch response: {es_response}")
-
-            logger.info(es_response)
-
-            restaurant_data = es_response.json()
-            logger.info(f"Elasticsearch response body: {json.dumps(restaurant_data)}")
-
-            if restaurant_data['hits']['total']['value'] > 0:
-                data_list = restaurant_data['hits']['hits']
-                random_list = [hit['_id'] for hit in data_list]
-
-                # Select 5 random restaurants
-                selected_restaurants = random.sample(random_list, k=5)
-
-                logger.info(f"Selected Restaurants: {selected_restaurants}")
-
-                # Fetch full restaurant details from DynamoDB
-                dynamodb = boto3.resource('dynamodb')
-                restaurants_list = dynamodb.batch_get_item(
-                    RequestItems={
-                        'yelp-restaurants': {'Keys': [{'business_id': id} for id in selected_restaurants]}
-                    }
-                )
-
-                logger.info(f"Fetched restaurant details: {restaurants_list}")
-
-                # Send restaurant suggestions via SES
-                ses_send_mail(restaurants_list, dining_details)
-
-                # Update past suggestions in DynamoDB
-                create_or_update_users_past_suggestions(
-                    restaurants_list['Responses']['yelp-restaurants'], dining_details
-                )
-
-            else:
-                logger.info(f"No restaurants found for cuisine: {cuisine}")
-
-        except Exception as e:
-            logger.error(f"Error processing message: {e}")
-            continue  # Skip to the next message in case of an error
-
-        finally:
-            # Delete the message from the SQS queue only after processing
-            sqs_delete_message(receipt_handle)
-
+    logger.info(f"Processed {processed_total} messages in {batches} batches, {failed_total} failed")
     return {
         'statusCode': 200,
         'body': json.dumps('Lambda executed successfully!')
     }
 
-def sqs_receive_message():
+
+def receive_batch(receives, wait_seconds):
     """
-    Receives messages from the SQS queue.
+    Receives up to receives * 10 messages, stopping at the first receive that is not full.
 
-    This function connects to SQS, receives messages from the specified queue,
-    and returns the result.
+    Args:
+        receives (int): The maximum number of receive calls.
+        wait_seconds (int): The long-poll wait of the first call; later calls do not wait.
 
     Returns:
-        dict: A dictionary containing the received messages.
+        list: Messages as returned by receive_message.
     """
-    sqs = boto3.client('sqs')
-    result = sqs.receive_message(
-        QueueUrl=os.environ.get('QUEUE_URL'),
-        MaxNumberOfMessages=10,
-        MessageAttributeNames=['All'],
-        VisibilityTimeout=40,
-        WaitTimeSeconds=10
-    )
-    return result
+    messages = []
+    for attempt in range(receives):
+        result = sqs_receive_message(wait_seconds=wait_seconds if attempt == 0 else 0)
+        log_payload("SQS receive_message", result)
+        received = result.get('Messages', [])
+        messages.extend(received)
+        if len(received) < SQS_MAX_MESSAGES:
+            break
+    return messages
 
 
-def sqs_delete_message(receipt_handle):
+def remaining_time_ms(context):
+    """Returns the time left in this invocation, or None when running without a Lambda context."""
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return None
+    return context.get_remaining_time_in_millis()
+
+
+def deadline_monotonic(context):
+    """Returns the time.monotonic() value at which work has to stop, or None without a Lambda context."""
+    remaining = remaining_time_ms(context)
+    if remaining is None:
+        return None
+    return time.monotonic() + (remaining - DEADLINE_MARGIN_MS) / 1000
+
+
+def run_stage(executor, tasks, context, label):
     """
-    Deletes the processed message from the SQS queue.
+    Runs independent tasks on the thread pool and waits for them until the deadline.
 
-    This function takes the Receipt Handle of the message to be deleted
-    and deletes it from the SQS queue.
+    Each task is isolated: an exception only fails that task. Tasks that have
+    not started when the invocation gets close to its deadline are skipped,
+    and tasks still running at the deadline are abandoned.
 
-    :param receipt_handle: The Receipt Handle of the message to be deleted
-    :type receipt_handle: str
+    Args:
+        executor (ThreadPoolExecutor): The pool to run the tasks on.
+        tasks (dict): Zero-argument callables keyed by an identifier.
+        context (Context): The Lambda context, used for the deadline.
+        label (str): A name for the stage, used in log messages.
+
+    Returns:
+        tuple: (results keyed by identifier, set of identifiers that failed).
     """
-    sqs = boto3.client('sqs')
-    queue_url = os.getenv('QUEUE_URL')
-    logger.info(f"Deleting message with receipt handle: {receipt_handle} from queue: {queue_url}")
+    results = {}
+    failed = set()
+    if not tasks:
+        return results, failed
 
-    try:
-        response = sqs.delete_message(
-            QueueUrl=queue_url,
-            ReceiptHandle=receipt_handle
-        )
-        logger.info(f"Deleted SQS message: {response}")
+    def run(task):
+        remaining = remaining_time_ms(context)
+        if remaining is not None and remaining < DEADLINE_MARGIN_MS:
+            raise TimeoutError(f"Skipped, only {remaining} ms left")
+        return task()
 
-    except sqs.exceptions.QueueDoesNotExist as e:
-        logger.error(f"The specified queue does not exist: {str(e)}")
-        raise
+    futures = {executor.submit(run, task): key for key, task in tasks.items()}
 
-    except Exception as e:
-        logger.error(f"Error deleting message: {str(e)}")
-        raise
+    remaining = remaining_time_ms(context)
+    timeout = None if remaining is None else max(0, remaining - DEADLINE_MARGIN_MS) / 1000
+    done, not_done = wait(futures, timeout=timeout)
+
+    for future in done:
+        if future.exception() is not None:
+            logger.error(f"Error in {label} for {futures[future]}: {future.exception()}")
+            failed.add(futures[future])
+        else:
+            results[futures[future]] = future.result()
 
+    for future in not_done:
+        logger.warning(f"Deadline reached before {label} for {futures[future]} finished")
+        future.cancel()
+        failed.add(futures[future])
 
-def ses_send_mail(restaurants_list, dining_details):
+    return results, failed
+
+
+def plan_batch(requests_by_id):
     """
-    Sends an email with restaurant suggestions using Amazon SES.
+    Groups the requests of a batch by their (Cuisine, Location) preference.
 
     Args:
-        restaurants_list (dict): A dictionary containing restaurant details fetched from DynamoDB.
-        dining_details (dict): A dictionary containing the user's dining preferences and email.
+        requests_by_id (dict): Parsed dining details keyed by SQS message ID.
+
+    Returns:
+        dict: Lists of message IDs keyed by (cuisine, location).
     """
-    SENDER = os.getenv('SENDER_EMAIL')
-    RECIPIENT = dining_details['Email']
-    SUBJECT = "Restaurant Suggestions from Foody"
-    
-    columns = ['name', 'address', 'rating', 'reviews']
-    reordered_dicts = [
-        reorder_dict(restaurant, columns)
-        for restaurant in restaurants_list['Responses']['yelp-restaurants']
-    ]
+    plan = {}
+    for message_id, dining_details in requests_by_id.items():
+        key = (dining_details['Cuisine'].lower(), (dining_details.get('Location') or '').lower())
+        plan.setdefault(key, []).append(message_id)
+    return plan
 
-    # Convert the reordered restaurant details into an HTML table
-    BODY_HTML = dict_to_html_table(reordered_dicts, dining_details['Cuisine'], dining_details['Location'])
 
-    ses_client = boto3.client('ses')
+def process_batch(messages, context):
+    """
+    Processes a batch of messages concurrently on a bounded thread pool.
+
+    The batch is processed in stages so that backend calls scale with the
+    number of distinct preferences rather than with the number of messages:
+        0. Each message is claimed in the idempotency store; messages that were
+           already handled are skipped and count as processed.
+        1. One candidate pool per (Cuisine, Location) group, taken from the
+           precomputed artifact when available and searched for otherwise.
+        2. An independent sample per user from the group's pool, skipping the
+           restaurants in the user's seen filter, followed by a single detail
+           fetch for every selected restaurant.
+        3. Rendering every email in one pass and sending them in bulk.
+        4. The history write for each message whose email was sent.
+    Finally, handled messages are marked completed and the claims of failed
+    ones are released.
+
+    A failure only fails the messages it affects. Messages that cannot finish
+    before the invocation gets close to its deadline are reported as failed so
+    that SQS delivers them again.
 
-    try:
-        # Send email using the SES client
-        response = ses_client.send_email(
-            Destination={'ToAddresses': [RECIPIENT]},
-            Message={
-                'Body': {'Html': {'Charset': 'UTF-8', 'Data': BODY_HTML}},
-                'Subject': {'Charset': 'UTF-8', 'Data': SUBJECT},
+    Args:
+        messages (dict): Message bodies keyed by SQS message ID.
+        context (Context): The Lambda context, used for the deadline.
+
+    Returns:
+        set: The IDs of the messages that were not processed successfully.
+    """
+    failed_ids = set()
+    requests_by_id = {}
+
+    for message_id, body in messages.items():
+        try:
+            dining_details = json.loads(body)
+            # Checked here so that a bad message fails alone rather than its batch
+            for field in ('Cuisine', 'Email', 'user_id'):
+                if not isinstance(dining_details.get(field), str) or not dining_details[field]:
+                    raise ValueError(f"{field} is missing")
+            requests_by_id[message_id] = dining_details
+        except Exception as e:
+            logger.error(f"Invalid message {message_id}: {e}")
+            failed_ids.add(message_id)
+
+    if not requests_by_id:
+        return failed_ids
+
+    # Stage 0: skip messages that were already handled, before any other
+    # backend call. Claims last until this invocation times out.
+    keys = {message_id: idempotency_key(message_id, details) for message_id, details in requests_by_id.items()}
+    remaining = remaining_time_ms(context)
+    lease_seconds = None if remaining is None else remaining / 1000
+    claims, failed_claims = run_stage(
+        executor,
+        {message_id: (lambda key=key: claim(key, lease_seconds)) for message_id, key in keys.items()},
+        context,
+        'idempotency claim'
+    )
+    failed_ids.update(failed_claims)
+
+    duplicates = [message_id for message_id, outcome in claims.items() if outcome == COMPLETED]
+    busy = [message_id for message_id, outcome in claims.items() if outcome == IN_PROGRESS]
+    count('IdempotencyChecks', len(keys))
+    count('DuplicateMessages', len(duplicates))
+    if duplicates or busy:
+        logger.info(f"Skipping {len(duplicates)} handled messages; {len(busy)} are being handled elsewhere")
+    # A message another worker is handling is retried once its claim lapses
+    failed_ids.update(busy)
+
+    claimed = {message_id: requests_by_id[message_id] for message_id, outcome in claims.items() if outcome == CLAIMED}
+    if claimed:
+        failed_ids.update(deliver_batch(claimed, executor, context))
+
+    # Remember what was handled and give failed messages back for a retry
+    run_stage(
+        executor,
+        {
+            message_id: (lambda key=keys[message_id], done=message_id not in failed_ids:
+                         complete(key) if done else release(key))
+            for message_id in claimed
+        },
+        context,
+        'idempotency settle'
+    )
+
+    return failed_ids
+
+
+def deliver_batch(requests_by_id, executor, context):
+    """
+    Runs stages 1 to 4 of process_batch for the claimed messages.
+
+    Args:
+        requests_by_id (dict): Parsed dining details keyed by SQS message ID.
+        executor (ThreadPoolExecutor): The pool to run the stages on.
+        context (Context): The Lambda context, used for the deadline.
+
+    Returns:
+        set: The IDs of the messages that were not processed successfully.
+    """
+    failed_ids = set()
+
+    plan = plan_batch(requests_by_id)
+    logger.info(f"Planned {len(requests_by_id)} messages into {len(plan)} preference groups")
+
+    # Stage 1: one candidate pool per distinct preference
+    pools, failed_groups = run_stage(
+        executor,
+        {
+            key: (lambda details=requests_by_id[ids[0]], group_size=len(ids):
+                  find_candidate_pool(details['Cuisine'], details.get('Location'), group_size))
+            for key, ids in plan.items()
+        },
+        context,
+        'candidate search'
+    )
+    for key in failed_groups:
+        failed_ids.update(plan[key])
+
+    # Stage 2: independent per-user samples that skip what each user was
+    # already suggested, and one combined detail fetch for the restaurants
+    # whose details did not come with the pool. A user whose filter cannot be
+    # read starts a new one.
+    seen_filters = {}
+    if SEEN_FILTER_ENABLED:
+        seen_filters, _ = run_stage(
+            executor,
+            {
+                message_id: (lambda user_id=dining_details['user_id']: load_seen_filter(user_id))
+                for message_id, dining_details in requests_by_id.items() if dining_details.get('user_id')
             },
-            Source=SENDER,
+            context,
+            'seen filter read'
         )
-        logger.info(f"Email sent! Message ID: {response['MessageId']}")
+
+    details = {}
+    selections = {}
+    for key, ids in plan.items():
+        if key in pools:
+            pool, known_details = pools[key]
+            details.update(known_details)
+            for message_id in ids:
+                selections[message_id] = draw_suggestions(pool, seen=seen_filters.get(message_id, ()))
+
+    missing_ids = list(dict.fromkeys(
+        business_id
+        for selected in selections.values() for business_id in selected
+        if business_id not in details
+    ))
+
+    try:
+        if missing_ids:
+            details.update(fetch_restaurants(missing_ids))
     except Exception as e:
-        logger.error(f"Failed to send email: {e}")
+        logger.error(f"Error fetching restaurant details: {e}")
+        failed_ids.update(selections)
+        return failed_ids
+
+    # Stage 3: render every email in one pass and send them in bulk
+    suggestions = {}
+    suggested_ids = {}
+    for message_id, selected in selections.items():
+        found_ids = [business_id for business_id in selected if business_id in details]
+        if found_ids:
+            suggested_ids[message_id] = found_ids
+            suggestions[message_id] = [details[business_id] for business_id in found_ids]
+        else:
+            logger.info(f"No restaurants found for cuisine: {requests_by_id[message_id]['Cuisine']}")
+
+    rendered = render_batch(
+        [(restaurants, requests_by_id[message_id], suggested_ids[message_id])
+         for message_id, restaurants in suggestions.items()]
+    )
+    send_results = send_bulk_email(
+        [
+            (message_id, requests_by_id[message_id]['Email'], email)
+            for message_id, email in zip(suggestions, rendered)
+        ],
+        deadline=deadline_monotonic(context)
+    )
+    sent_ids = [message_id for message_id in suggestions if send_results[message_id].ok]
+    count('EmailsSent', len(sent_ids))
+    failed_ids.update(message_id for message_id in suggestions if not send_results[message_id].ok)
+
+    # Stage 4: record the suggestions of every email that was sent. A failed
+    # write is only logged, since retrying the message would email the user again.
+    run_stage(
+        executor,
+        {
+            message_id: (lambda business_ids=suggested_ids[message_id], restaurants=suggestions[message_id],
+                         dining_details=requests_by_id[message_id], seen=seen_filters.get(message_id):
+                         create_or_update_users_past_suggestions(business_ids, restaurants, dining_details, seen))
+            for message_id in sent_ids
+        },
+        context,
+        'history write'
+    )
+
+    return failed_ids
+
 
-def create_or_update_users_past_suggestions(restaurants, dining_details):
+@traced('sqs_receive')
+def sqs_receive_message(max_messages=SQS_MAX_MESSAGES, wait_seconds=SQS_WAIT_TIME_SECONDS):
+    """
+    Receives messages from the SQS queue.
+
+    This function connects to SQS, receives messages from the specified queue,
+    and returns the result.
+
+    Args:
+        max_messages (int): The maximum number of messages to receive (at most 10).
+        wait_seconds (int): How long to long-poll for messages (at most 20).
+
+    Returns:
+        dict: A dictionary containing the received messages.
+    """
+    sqs = get_client('sqs')
+    result = sqs.receive_message(
+        QueueUrl=os.environ.get('QUEUE_URL'),
+        MaxNumberOfMessages=max_messages,
+        MessageAttributeNames=['All'],
+        VisibilityTimeout=SQS_VISIBILITY_TIMEOUT,
+        WaitTimeSeconds=wait_seconds
+    )
+    return result
+
+
+@traced('sqs_delete')
+def sqs_delete_message_batch(messages):
+    """
+    Deletes processed messages from the SQS queue in batches of up to 10.
+
+    Args:
+        messages (list): Messages as returned by receive_message.
+
+    Raises:
+        RuntimeError: If SQS reports that some of the messages were not deleted.
+    """
+    sqs = get_client('sqs')
+    queue_url = os.getenv('QUEUE_URL')
+    failed = []
+
+    for start in range(0, len(messages), 10):
+        entries = [
+            {'Id': str(index), 'ReceiptHandle': message['ReceiptHandle']}
+            for index, message in enumerate(messages[start:start + 10])
+        ]
+        logger.info(f"Deleting {len(entries)} messages from queue: {queue_url}")
+
+        try:
+            response = sqs.delete_message_batch(QueueUrl=queue_url, Entries=entries)
+            logger.debug(f"Deleted SQS messages: {response.get('Successful', [])}")
+            failed.extend(response.get('Failed', []))
+
+        except sqs.exceptions.QueueDoesNotExist as e:
+            logger.error(f"The specified queue does not exist: {str(e)}")
+            raise
+
+    if failed:
+        # The messages become visible again and are processed a second time
+        logger.error(f"Error deleting messages: {failed}")
+        raise RuntimeError(f"Failed to delete {len(failed)} SQS messages")
+
+
+@traced('history_write')
+def create_or_update_users_past_suggestions(business_ids, restaurants, dining_details, seen=None):
     """
     Updates the user's past restaurant suggestions in DynamoDB.
 
+    The item is written in the HISTORY_FORMAT of suggestion_history, by
+    default only the business IDs and the fields needed to send them again,
+    together with the user's seen-restaurant filter.
+
     Args:
-        restaurants: List of restaurant details to be updated.
+        business_ids: IDs of the suggested restaurants.
+        restaurants: List of restaurant details, in the same order.
         dining_details: User's dining preferences and details.
+        seen: The user's SeenFilter as read for this request, if any.
     """
-    logger.info(f"Attempting to update past suggestions for {dining_details} with {restaurants}")
+    logger.debug(f"Updating past suggestions of {dining_details.get('user_id')}")
     try:
-        dynamodb = boto3.resource('dynamodb')
-        table = dynamodb.Table('past-restaurant-suggestions')
-        
-        record = {
-            'user_id': dining_details['user_id'],
-            'dining_details': dining_details,
-            'restaurants': restaurants
-        }
-        
+        table = get_table('past-restaurant-suggestions')
+
+        seen_filter = None
+        if SEEN_FILTER_ENABLED:
+            seen = seen or SeenFilter.empty()
+            for business_id in business_ids:
+                seen.add(business_id)
+            seen_filter = seen.to_bytes()
+
+        record = encode_history(dining_details['user_id'], business_ids, restaurants, dining_details,
+                                catalog_version(), seen_filter)
+
         # Update the item in DynamoDB
         response = table.put_item(Item=record)
-        logger.info(f"Updated past suggestions: {response}")
+        log_payload("Updated past suggestions", response)
     except Exception as e:
         logger.error(f"Failed to update past suggestions: {e}")
@@ -0,0 +1,261 @@
+import json
+import logging
+import os
+import random
+import threading
+
+from candidate_pools import get_candidate_pools, pool_key
+from cuisine_index import get_cuisine_index
+from geo_index import GEO_MAX_DISTANCE_KM, get_geo_index
+from seen_filter import SEEN_FILTER_ENABLED
+from weighted_sampling import AliasTable, AliasTableCache, restaurant_weight
+from tracing import traced
+
+logger = logging.getLogger()
+
+# Connections to Elasticsearch are kept alive across invocations of a warm
+# container
+ES_CONNECT_TIMEOUT = float(os.environ.get('ES_CONNECT_TIMEOUT', 2))
+ES_READ_TIMEOUT = float(os.environ.get('ES_READ_TIMEOUT', 5))
+ES_MAX_POOL_CONNECTIONS = int(os.environ.get('ES_MAX_POOL_CONNECTIONS', 10))
+
+_http = None
+_http_lock = threading.Lock()
+
+# 'random_score' samples on the Elasticsearch side and returns only IDs;
+# 'match' fetches every hit for the cuisine and samples in the Lambda.
+SEARCH_MODE = os.environ.get('SEARCH_MODE', 'random_score')
+
+# Number of restaurants suggested to the user
+SUGGESTION_COUNT = int(os.environ.get('SUGGESTION_COUNT', 5))
+
+# Upper bound on the candidate pool shared by the requests of one
+# (Cuisine, Location) group within a batch
+CANDIDATE_POOL_SIZE = int(os.environ.get('CANDIDATE_POOL_SIZE', 100))
+
+# Maximum number of hits fetched in 'match' mode
+MATCH_MODE_SIZE = 1000
+
+# Weighted samplers of the candidate pools, rebuilt when the artifact version changes
+_alias_tables = AliasTableCache()
+
+
+def cuisine_query(cuisine):
+    """Builds the query clause that matches restaurants serving the cuisine."""
+    return {
+        "match": {
+            "Cuisine": {
+                "query": cuisine.capitalize(),
+                "operator": "and"
+            }
+        }
+    }
+
+
+def build_random_score_query(cuisine, size, seed):
+    """
+    Builds a query that returns a random sample of restaurant IDs for a cuisine.
+
+    Args:
+        cuisine (str): The cuisine to search for.
+        size (int): The number of restaurants to return.
+        seed (int): The seed for random_score; a new one is used per request.
+
+    Returns:
+        dict: The Elasticsearch request body.
+    """
+    return {
+        "query": {
+            "function_score": {
+                "query": cuisine_query(cuisine),
+                "random_score": {"seed": seed, "field": "_seq_no"},
+                "boost_mode": "replace"
+            }
+        },
+        "size": size,
+        "_source": False
+    }
+
+
+def build_match_query(cuisine):
+    """Builds the query that returns every restaurant for a cuisine."""
+    return {
+        "query": cuisine_query(cuisine),
+        "size": MATCH_MODE_SIZE,
+        "_source": False
+    }
+
+
+def _get_http():
+    """Returns the pooled HTTP client for Elasticsearch, creating it on first use."""
+    global _http
+
+    if _http is None:
+        with _http_lock:
+            if _http is None:
+                # urllib3 is already part of the runtime through botocore; it is
+                # imported here so that pools-only deployments never load it
+                import urllib3
+
+                _http = urllib3.PoolManager(
+                    maxsize=ES_MAX_POOL_CONNECTIONS,
+                    timeout=urllib3.Timeout(connect=ES_CONNECT_TIMEOUT, read=ES_READ_TIMEOUT),
+                    retries=urllib3.Retry(total=2, backoff_factor=0.1, status_forcelist=(429, 502, 503, 504)),
+                    headers={
+                        'Content-Type': 'application/json',
+                        **urllib3.make_headers(
+                            keep_alive=True,
+                            basic_auth=f"{os.getenv('ES_USERNAME')}:{os.getenv('ES_PASSWORD')}"
+                        )
+                    }
+                )
+    return _http
+
+
+def es_search(query):
+    """
+    Sends a search request to Elasticsearch.
+
+    Args:
+        query (dict): The request body.
+
+    Returns:
+        dict: The decoded response body.
+    """
+    host = os.getenv('ES_HOST')
+    response = _get_http().request('GET', f"{host}/_search", body=json.dumps(query))
+    if response.status >= 400:
+        raise RuntimeError(f"Elasticsearch search failed with {response.status}: {response.data[:200]!r}")
+    return json.loads(response.data)
+
+
+def search_restaurant_ids(cuisine, k=SUGGESTION_COUNT):
+    """
+    Returns up to k randomly selected restaurant IDs for a cuisine.
+
+    The embedded cuisine index snapshot is used when one is configured and
+    knows the cuisine; Elasticsearch is the fallback. Fewer than k IDs are
+    returned when the cuisine has fewer restaurants.
+
+    Args:
+        cuisine (str): The cuisine to search for.
+        k (int): The number of restaurants wanted.
+
+    Returns:
+        list: The selected business IDs.
+    """
+    index = get_cuisine_index()
+    if index is not None and cuisine in index:
+        selected = index.sample(cuisine, k)
+        logger.info(f"Cuisine index {index.version} returned {len(selected)} IDs for {cuisine}")
+        return selected
+
+    if SEARCH_MODE == 'match':
+        restaurant_data = es_search(build_match_query(cuisine))
+        random_list = [hit['_id'] for hit in restaurant_data['hits']['hits']]
+        selected = random.sample(random_list, k=min(k, len(random_list)))
+    else:
+        seed = random.getrandbits(31)
+        restaurant_data = es_search(build_random_score_query(cuisine, k, seed))
+        selected = [hit['_id'] for hit in restaurant_data['hits']['hits']]
+
+    logger.info(f"Elasticsearch returned {len(restaurant_data['hits']['hits'])} hits for {cuisine}")
+    return selected
+
+
+def catalog_version():
+    """
+    Returns the version of the restaurant snapshot suggestions are drawn from.
+
+    Returns:
+        str: The version of the candidate pools, the cuisine index or the geo
+            index, whichever is configured first, or None when only
+            Elasticsearch is searched.
+    """
+    for snapshot in (get_candidate_pools(), get_cuisine_index(), get_geo_index()):
+        if snapshot is not None:
+            return snapshot.version
+    return None
+
+
+def candidate_pool_size(group_size, k=SUGGESTION_COUNT):
+    """
+    Returns how many candidates to fetch for a group of requests with the same preference.
+
+    With the seen filter on, even a single request gets twice k candidates,
+    so that a repeat user can skip the restaurants they were already suggested.
+    """
+    minimum = 2 * k if SEEN_FILTER_ENABLED else k
+    return max(minimum, min(CANDIDATE_POOL_SIZE, k * group_size))
+
+
+@traced('search')
+def find_candidate_pool(cuisine, location, group_size):
+    """
+    Returns the candidate pool shared by a group of requests with the same preference.
+
+    When the location is a neighborhood or ZIP code and the geo index knows
+    the cuisine, the pool is the restaurants nearest to it. Otherwise the
+    precomputed candidate pool artifact is used when it has a pool for the
+    preference: its best ranked entries come with their display fields, so no
+    further lookups are needed, and their ratings weight the draw. Otherwise
+    the pool is searched for.
+
+    Args:
+        cuisine (str): The requested cuisine.
+        location (str): The requested location.
+        group_size (int): The number of requests sharing the pool.
+
+    Returns:
+        tuple: (the pool, either a list of business IDs or an AliasTable over
+            them, and a dict of known restaurant details keyed by ID).
+    """
+    geo = get_geo_index()
+    point = geo.resolve(location) if geo is not None else None
+    if point is not None and cuisine in geo:
+        nearby = geo.nearest(cuisine, *point, candidate_pool_size(group_size), GEO_MAX_DISTANCE_KM)
+        if nearby:
+            logger.info(f"Geo index {geo.version} returned {len(nearby)} restaurants for {cuisine} near {location}")
+            return [business_id for business_id, _ in nearby], {}
+
+    artifact = get_candidate_pools()
+    pool = artifact.pool(cuisine, location) if artifact is not None else None
+    if pool:
+        ranked = pool[:CANDIDATE_POOL_SIZE]
+        details = {restaurant['business_id']: restaurant for restaurant in ranked}
+        logger.info(f"Candidate pools {artifact.version} returned {len(ranked)} restaurants for {cuisine}")
+        table = _alias_tables.get(
+            pool_key(cuisine, location),
+            artifact.version,
+            lambda: AliasTable(list(details), [restaurant_weight(restaurant) for restaurant in details.values()])
+        )
+        return table, details
+
+    return search_restaurant_ids(cuisine, candidate_pool_size(group_size)), {}
+
+
+def draw_suggestions(pool, k=SUGGESTION_COUNT, seen=()):
+    """
+    Draws up to k distinct restaurant IDs from a candidate pool, independently per user.
+
+    An AliasTable pool is drawn from by weight; a list of IDs uniformly.
+    Restaurants in seen are skipped unless the pool has too few others.
+
+    Args:
+        pool (list or AliasTable): The candidate pool.
+        k (int): The number of restaurants wanted.
+        seen: A container of business IDs the user was already suggested.
+
+    Returns:
+        list: The drawn business IDs.
+    """
+    if isinstance(pool, AliasTable):
+        return pool.sample(k, excluded=seen)
+
+    k = min(k, len(pool))
+    fresh = [business_id for business_id in pool if business_id not in seen] if seen else pool
+    if len(fresh) >= k:
+        return random.sample(fresh, k=k)
+    fresh_ids = set(fresh)
+    return random.sample(fresh, k=len(fresh)) + random.sample(
+        [business_id for business_id in pool if business_id not in fresh_ids], k=k - len(fresh))
@@ -0,0 +1,135 @@
+import hashlib
+import logging
+import math
+import os
+import struct
+import time
+
+from aws_clients import get_table
+from tracing import traced
+
+logger = logging.getLogger()
+
+PAST_SUGGESTIONS_TABLE = 'past-restaurant-suggestions'
+
+# Repeat users skip restaurants they were already suggested. Each user's
+# filter is a Bloom filter sized for SEEN_FILTER_CAPACITY restaurants at the
+# given false-positive rate (about 130 bytes for 100 at 1%), and starts over
+# once it is full or older than SEEN_FILTER_RESET_DAYS.
+SEEN_FILTER_ENABLED = os.environ.get('SEEN_FILTER_ENABLED', 'true').lower() == 'true'
+SEEN_FILTER_CAPACITY = int(os.environ.get('SEEN_FILTER_CAPACITY', 100))
+SEEN_FILTER_FP_RATE = float(os.environ.get('SEEN_FILTER_FP_RATE', 0.01))
+SEEN_FILTER_RESET_DAYS = float(os.environ.get('SEEN_FILTER_RESET_DAYS', 30))
+
+SEEN_FILTER_ATTRIBUTE = 'seen_filter'
+
+# Layout: format version, hash count, restaurants added (uint16), creation
+# time (uint32 epoch seconds), then the bit array
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<BBHI')
+
+
+def filter_dimensions(capacity, fp_rate):
+    """
+    Returns the size of a Bloom filter holding capacity items at fp_rate.
+
+    Returns:
+        tuple: (number of bytes of the bit array, number of hash functions).
+    """
+    bits = math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2)
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return math.ceil(bits / 8), hashes
+
+
+class SeenFilter:
+    """
+    A Bloom filter of the business IDs suggested to one user.
+
+    Membership can be a false positive at about the configured rate, which
+    only means a fresh restaurant is skipped; it is never a false negative
+    while the filter lives.
+
+    Args:
+        size_bytes (int): The size of the bit array.
+        hashes (int): The number of bit positions per ID.
+        count (int): How many IDs were added.
+        created_at (int): When the filter was started, in epoch seconds.
+        bits (bytes): The bit array, or None for an empty one.
+    """
+
+    def __init__(self, size_bytes, hashes, count=0, created_at=None, bits=None):
+        self.hashes = hashes
+        self.count = count
+        self.created_at = int(time.time()) if created_at is None else created_at
+        self.bits = bytearray(bits) if bits is not None else bytearray(size_bytes)
+
+    @classmethod
+    def empty(cls):
+        """Returns a new filter sized from the configuration."""
+        return cls(*filter_dimensions(SEEN_FILTER_CAPACITY, SEEN_FILTER_FP_RATE))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Decodes a stored filter, or starts a new one if it is due for a reset.
+
+        A filter is reset when it is older than SEEN_FILTER_RESET_DAYS, when it
+        holds SEEN_FILTER_CAPACITY IDs (its false-positive rate would climb),
+        or when the configured size has changed.
+        """
+        version, hashes, count, created_at = HEADER.unpack_from(data, 0)
+        bits = data[HEADER.size:]
+        if (
+            version != FORMAT_VERSION
+            or (len(bits), hashes) != filter_dimensions(SEEN_FILTER_CAPACITY, SEEN_FILTER_FP_RATE)
+            or count >= SEEN_FILTER_CAPACITY
+            or time.time() - created_at > SEEN_FILTER_RESET_DAYS * 86400
+        ):
+            return cls.empty()
+        return cls(len(bits), hashes, count, created_at, bits)
+
+    def to_bytes(self):
+        return HEADER.pack(FORMAT_VERSION, self.hashes, min(self.count, 0xFFFF), self.created_at) + bytes(self.bits)
+
+    def _positions(self, business_id):
+        # Double hashing: positions h1 + i * h2 from one 128-bit digest
+        digest = hashlib.blake2b(business_id.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = struct.unpack('<QQ', digest)
+        size = len(self.bits) * 8
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def __contains__(self, business_id):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(business_id))
+
+    def add(self, business_id):
+        if business_id in self:
+            return
+        for position in self._positions(business_id):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+
+@traced('history_read')
+def load_seen_filter(user_id):
+    """
+    Reads the seen-restaurant filter of a user.
+
+    Only the filter attribute is read. Users without one get an empty filter.
+
+    Args:
+        user_id (str): The Lex session ID the suggestions are stored under.
+
+    Returns:
+        SeenFilter: The user's filter, reset if it was due.
+    """
+    item = get_table(PAST_SUGGESTIONS_TABLE).get_item(
+        Key={'user_id': user_id},
+        ProjectionExpression='#s',
+        ExpressionAttributeNames={'#s': SEEN_FILTER_ATTRIBUTE}
+    ).get('Item') or {}
+
+    data = item.get(SEEN_FILTER_ATTRIBUTE)
+    if data is None:
+        return SeenFilter.empty()
+    # boto3 wraps binary attributes in a Binary object
+    return SeenFilter.from_bytes(bytes(getattr(data, 'value', data)))
@@ -0,0 +1,91 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger()
+
+
+def parse_s3_uri(uri):
+    """Splits an s3://bucket/key URI into (bucket, key)."""
+    bucket, _, key = uri[len('s3://'):].partition('/')
+    return bucket, key
+
+
+def s3_download(bucket, key, prefix):
+    """
+    Downloads an S3 object to a new file in /tmp.
+
+    Returns:
+        str: The path of the downloaded file.
+    """
+    from aws_clients import get_client
+
+    fd, path = tempfile.mkstemp(prefix=prefix, dir='/tmp')
+    os.close(fd)
+    get_client('s3').download_file(bucket, key, path)
+    return path
+
+
+class RefreshingSnapshot:
+    """
+    Holds the current version of a read-only snapshot and refreshes it on a TTL.
+
+    The first access loads the snapshot synchronously, and concurrent callers
+    wait for that load rather than get None. Once the TTL has passed,
+    the next access starts a background check and keeps returning the current
+    snapshot until the new one has been loaded, so readers are never blocked
+    and always see a complete version.
+
+    Args:
+        name (str): A name for the snapshot, used in log messages.
+        load (callable): Called with the current snapshot (or None); returns a
+            new snapshot, or None when the current one is still up to date.
+        ttl_seconds (int): How often to check for a new version.
+    """
+
+    def __init__(self, name, load, ttl_seconds):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.current = None
+        self._load = load
+        self._checked_at = None
+        self._refreshing = threading.Lock()
+
+    def _refresh(self):
+        try:
+            snapshot = self._load(self.current)
+            if snapshot is not None:
+                previous, self.current = self.current, snapshot
+                logger.info(f"Loaded {self.name} version {snapshot.version}")
+                if previous is not None and getattr(previous, 'temporary', False):
+                    # Open memory maps stay valid after the file is unlinked
+                    os.remove(previous.path)
+        except Exception as e:
+            logger.error(f"Failed to load {self.name}: {e}")
+        finally:
+            self._refreshing.release()
+
+    def get(self):
+        """Returns the current snapshot, or None if none could be loaded yet."""
+        now = time.monotonic()
+        fresh = self._checked_at is not None and now - self._checked_at < self.ttl_seconds
+        if self.current is not None and fresh:
+            return self.current
+
+        if self.current is None:
+            self._refreshing.acquire()
+            # Callers that waited on a load attempt take its outcome, even a failed one
+            if self.current is None and (self._checked_at is None or now - self._checked_at >= self.ttl_seconds):
+                self._checked_at = now
+                self._refresh()
+            else:
+                self._refreshing.release()
+            return self.current
+
+        if self._refreshing.acquire(blocking=False):
+            self._checked_at = now
+            threading.Thread(target=self._refresh, daemon=True).start()
+
+        return self.current
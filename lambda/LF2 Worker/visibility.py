@@ -0,0 +1,67 @@
+import logging
+import threading
+
+from aws_clients import get_client
+
+logger = logging.getLogger()
+
+# change_message_visibility_batch accepts at most 10 entries per request
+VISIBILITY_BATCH_SIZE = 10
+
+
+class VisibilityHeartbeat:
+    """
+    Keeps received SQS messages invisible while a batch is being processed.
+
+    A background thread extends the visibility timeout of every message
+    halfway through each timeout, so that a slow batch is not delivered to a
+    second worker. Use it as a context manager around the processing.
+
+    Args:
+        queue_url (str): The queue the messages were received from.
+        messages (list): Messages as returned by receive_message.
+        visibility_timeout (int): Seconds each extension keeps the messages hidden.
+    """
+
+    def __init__(self, queue_url, messages, visibility_timeout):
+        self.queue_url = queue_url
+        self.messages = list(messages)
+        self.visibility_timeout = visibility_timeout
+        self.extensions = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name='sqs-visibility-heartbeat', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.visibility_timeout / 2):
+            try:
+                self.extend()
+            except Exception as e:
+                logger.error(f"Failed to extend message visibility: {e}")
+
+    def extend(self):
+        """Resets the visibility timeout of every message to visibility_timeout."""
+        sqs = get_client('sqs')
+        failed = []
+        for start in range(0, len(self.messages), VISIBILITY_BATCH_SIZE):
+            response = sqs.change_message_visibility_batch(
+                QueueUrl=self.queue_url,
+                Entries=[
+                    {'Id': str(index), 'ReceiptHandle': message['ReceiptHandle'],
+                     'VisibilityTimeout': self.visibility_timeout}
+                    for index, message in enumerate(self.messages[start:start + VISIBILITY_BATCH_SIZE])
+                ]
+            )
+            failed.extend(response.get('Failed', []))
+
+        self.extensions += 1
+        if failed:
+            logger.warning(f"Could not extend visibility of {len(failed)} messages: {failed}")
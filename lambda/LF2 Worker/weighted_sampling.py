@@ -0,0 +1,185 @@
+import heapq
+import logging
+import math
+import os
+import random
+import threading
+
+logger = logging.getLogger()
+
+# How restaurants are weighted when suggestions are drawn from a pool whose
+# ratings are known: 'bayesian', 'rating' or 'uniform'
+SUGGESTION_SCORING = os.environ.get('SUGGESTION_SCORING', 'bayesian')
+
+# 'bayesian' shrinks a rating towards PRIOR_RATING as if it had PRIOR_REVIEWS
+# more reviews, so 5 stars from 3 reviews do not beat 4.5 stars from 500.
+# Each extra star then multiplies the weight by e ** SHARPNESS.
+SCORING_PRIOR_RATING = float(os.environ.get('SCORING_PRIOR_RATING', 3.5))
+SCORING_PRIOR_REVIEWS = float(os.environ.get('SCORING_PRIOR_REVIEWS', 20))
+SCORING_SHARPNESS = float(os.environ.get('SCORING_SHARPNESS', 1.5))
+
+
+def bayesian_score(rating, review_count):
+    """Weights a restaurant by its rating, discounted when it has few reviews."""
+    adjusted = (rating * review_count + SCORING_PRIOR_RATING * SCORING_PRIOR_REVIEWS) / (review_count + SCORING_PRIOR_REVIEWS)
+    return math.exp(SCORING_SHARPNESS * (adjusted - 5))
+
+
+SCORING_FUNCTIONS = {
+    'bayesian': bayesian_score,
+    'rating': lambda rating, review_count: rating,
+    'uniform': lambda rating, review_count: 1.0,
+}
+
+
+def restaurant_weight(restaurant, scoring=None):
+    """
+    Returns the sampling weight of a restaurant record.
+
+    Args:
+        restaurant (dict): A record with 'rating' and 'review_count'.
+        scoring (str): A SCORING_FUNCTIONS name. Defaults to SUGGESTION_SCORING.
+
+    Returns:
+        float: A non-negative weight.
+    """
+    score = SCORING_FUNCTIONS[scoring or SUGGESTION_SCORING]
+    return max(0.0, score(float(restaurant.get('rating') or 0), int(restaurant.get('review_count') or 0)))
+
+
+class AliasTable:
+    """
+    Draws items with probability proportional to their weights in O(1) per draw.
+
+    Built with Vose's alias method in O(n): every slot holds a probability of
+    keeping its own item and an alias to take otherwise, so a draw is one
+    random slot and one coin flip.
+
+    Args:
+        items (list): The items to draw from, e.g. business IDs.
+        weights (list): A non-negative weight per item. If they are all zero,
+            every item is equally likely.
+    """
+
+    def __init__(self, items, weights):
+        self.items = list(items)
+        self.weights = [float(weight) for weight in weights]
+        n = len(self.items)
+        if n != len(self.weights):
+            raise ValueError("items and weights differ in length")
+
+        total = sum(self.weights)
+        scaled = [weight * n / total for weight in self.weights] if total > 0 else [1.0] * n
+
+        self._probabilities = [1.0] * n
+        self._aliases = list(range(n))
+        small = [index for index, value in enumerate(scaled) if value < 1.0]
+        large = [index for index, value in enumerate(scaled) if value >= 1.0]
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._probabilities[less] = scaled[less]
+            self._aliases[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+
+        # Whatever is left over is 1 up to rounding errors
+        for index in small + large:
+            self._probabilities[index] = 1.0
+
+    def __len__(self):
+        return len(self.items)
+
+    def draw_index(self, rng=random):
+        """Returns the index of one weighted draw."""
+        slot = int(rng.random() * len(self._probabilities))
+        return slot if rng.random() < self._probabilities[slot] else self._aliases[slot]
+
+    def sample(self, k, rng=random, excluded=()):
+        """
+        Draws up to k distinct items, each draw weighted among the items not yet drawn.
+
+        Repeated draws are rejected, which takes close to k draws as long as
+        no few items hold most of the weight. If rejections pile up, the rest
+        is drawn exactly in O(n).
+
+        Args:
+            k (int): The number of items wanted.
+            rng (random.Random): The source of randomness.
+            excluded: A container of items to avoid, e.g. a SeenFilter. They
+                are only drawn when too few other items are left.
+
+        Returns:
+            list: The drawn items, in draw order.
+        """
+        n = len(self.items)
+        k = min(k, n)
+        chosen = {}
+        skipped = set()
+        for _ in range(4 * k + 16):
+            if len(chosen) == k:
+                break
+            index = self.draw_index(rng)
+            if index in chosen or index in skipped:
+                continue
+            if excluded and self.items[index] in excluded:
+                skipped.add(index)
+                continue
+            chosen[index] = None
+
+        if len(chosen) < k:
+            chosen.update(dict.fromkeys(self._exact_sample(
+                k - len(chosen), lambda index: index in chosen or index in skipped or (
+                    excluded and self.items[index] in excluded), rng)))
+
+        if len(chosen) < k:
+            # Too few items left to avoid: repeat some rather than return fewer
+            chosen.update(dict.fromkeys(self._exact_sample(k - len(chosen), chosen.__contains__, rng)))
+
+        return [self.items[index] for index in chosen]
+
+    def _exact_sample(self, k, is_excluded, rng):
+        """Weighted sampling without replacement over the items not excluded (Efraimidis-Spirakis)."""
+        keyed = (
+            (math.log(1.0 - rng.random()) / weight if weight > 0 else -math.inf, index)
+            for index, weight in enumerate(self.weights) if not is_excluded(index)
+        )
+        return [index for _, index in heapq.nlargest(k, keyed)]
+
+
+class AliasTableCache:
+    """
+    Keeps one AliasTable per key, rebuilt only when the catalog version changes.
+
+    Safe to use from the worker threads of a batch.
+    """
+
+    def __init__(self):
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, version, build):
+        """
+        Returns the table for key at the given version, building it if needed.
+
+        Args:
+            key (str): What the table is for, e.g. a candidate pool key.
+            version (str): The version of the data the table is built from.
+            build (callable): Returns a new AliasTable.
+
+        Returns:
+            AliasTable: The cached or newly built table.
+        """
+        with self._lock:
+            cached = self._tables.get(key)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+
+        table = build()
+        with self._lock:
+            if self._tables and next(iter(self._tables.values()))[0] != version:
+                # A new catalog version replaces every table of the previous one
+                self._tables.clear()
+            self._tables[key] = (version, table)
+        logger.info(f"Built alias table for {key} at version {version} with {len(table)} items")
+        return table
@@ -0,0 +1,137 @@
+import os
+import threading
+
+# boto3 and botocore take a few hundred milliseconds to import, so they are only
+# imported once a handler actually calls AWS. Dialog turns that never do (and
+# fast-path replies) do not pay for them on a cold start.
+
+# Clients live at module scope so that warm Lambda containers reuse them (and
+# their keep-alive connection pools) across invocations.
+_clients = {}
+_resources = threading.local()
+_registered_resources = {}
+_lock = threading.Lock()
+_configs = {}
+
+DEFAULT_CONFIG_OPTIONS = {
+    'connect_timeout': float(os.environ.get('AWS_CONNECT_TIMEOUT', 2)),
+    'read_timeout': float(os.environ.get('AWS_READ_TIMEOUT', 5)),
+    'max_pool_connections': int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 25)),
+    'tcp_keepalive': True,
+    'retries': {
+        'mode': 'adaptive',
+        'max_attempts': int(os.environ.get('AWS_MAX_ATTEMPTS', 3))
+    }
+}
+
+# Per-service overrides merged on top of DEFAULT_CONFIG_OPTIONS.
+SERVICE_CONFIG_OPTIONS = {
+    # Lex can take a while when it invokes the fulfillment Lambda (LF1).
+    'lexv2-runtime': {'read_timeout': 10},
+    # SQS long polling holds the connection open for up to 20 seconds.
+    'sqs': {'read_timeout': 25},
+}
+
+
+def _config_for(service_name):
+    config = _configs.get(service_name)
+    if config is None:
+        from botocore.config import Config
+
+        config = _configs[service_name] = Config(**{**DEFAULT_CONFIG_OPTIONS, **SERVICE_CONFIG_OPTIONS.get(service_name, {})})
+    return config
+
+
+def get_client(service_name):
+    """
+    Returns a shared boto3 client for the given service, creating it on first use.
+
+    boto3 clients are thread-safe, so a single client per service is shared by
+    every thread in the container.
+
+    Args:
+        service_name (str): The AWS service name, e.g. 'sqs' or 'ses'.
+
+    Returns:
+        botocore.client.BaseClient: The cached client.
+    """
+    client = _clients.get(service_name)
+    if client is None:
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                import boto3
+
+                client = boto3.client(service_name, config=_config_for(service_name))
+                _clients[service_name] = client
+    return client
+
+
+def get_resource(service_name):
+    """
+    Returns a boto3 resource for the given service, creating it on first use.
+
+    boto3 resources are not thread-safe, so one instance is cached per thread,
+    each created from its own boto3 Session: the default session must not be
+    used from several threads at once. Threads that live across invocations,
+    such as those of a module-scope thread pool, keep reusing their resource.
+
+    Args:
+        service_name (str): The AWS service name, e.g. 'dynamodb'.
+
+    Returns:
+        boto3.resources.base.ServiceResource: The cached resource.
+    """
+    resource = _registered_resources.get(service_name)
+    if resource is not None:
+        return resource
+
+    cache = getattr(_resources, 'cache', None)
+    if cache is None:
+        cache = _resources.cache = {}
+
+    resource = cache.get(service_name)
+    if resource is None:
+        import boto3
+
+        resource = boto3.session.Session().resource(service_name, config=_config_for(service_name))
+        cache[service_name] = resource
+    return resource
+
+
+def get_table(table_name):
+    """
+    Returns a DynamoDB Table backed by the shared per-thread resource.
+
+    Args:
+        table_name (str): The name of the DynamoDB table.
+
+    Returns:
+        boto3.resources.factory.dynamodb.Table: The table resource.
+    """
+    return get_resource('dynamodb').Table(table_name)
+
+
+def register_client(service_name, client):
+    """
+    Installs the client returned for a service, e.g. a local stand-in.
+
+    Args:
+        service_name (str): The AWS service name.
+        client: The object to return from get_client(service_name).
+    """
+    with _lock:
+        _clients[service_name] = client
+
+
+def register_resource(service_name, resource):
+    """
+    Installs the resource returned for a service in every thread.
+
+    The object is shared, so it must be thread-safe, unlike boto3 resources.
+
+    Args:
+        service_name (str): The AWS service name.
+        resource: The object to return from get_resource(service_name).
+    """
+    _registered_resources[service_name] = resource
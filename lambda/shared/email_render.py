@@ -0,0 +1,147 @@
+from collections import namedtuple
+from functools import lru_cache
+from html import escape
+
+from tracing import traced
+
+SUBJECT = "Restaurant Suggestions from Foody"
+
+# The restaurant fields shown in the suggestion email, in column order
+EMAIL_COLUMNS = ('name', 'address', 'rating', 'reviews')
+
+RenderedEmail = namedtuple('RenderedEmail', ['subject', 'html', 'text'])
+
+HTML_TEMPLATE = """<html>
+            <head></head>
+            <body>
+            <h1> Here is your suggestions for {cuisine} restaurants in {location}</h1>
+            {content}
+        <br><br>
+        <p> Hope you like the suggestions.
+                </body>
+            </html>"""
+
+TEXT_TEMPLATE = """Here is your suggestions for {cuisine} restaurants in {location}
+
+{content}
+
+Hope you like the suggestions."""
+
+EMPTY_HTML = "<p> We could not find any restaurants this time.</p>"
+EMPTY_TEXT = "We could not find any restaurants this time."
+
+
+def _split_template(template):
+    """Splits a template at its {cuisine}, {location} and {content} fields, which appear in that order."""
+    head, _, rest = template.partition('{cuisine}')
+    middle, _, rest = rest.partition('{location}')
+    before_content, _, tail = rest.partition('{content}')
+    return head, middle, before_content, tail
+
+
+# Concatenating the pieces is several times cheaper than str.format
+_HTML_PARTS = _split_template(HTML_TEMPLATE)
+_TEXT_PARTS = _split_template(TEXT_TEMPLATE)
+
+
+def _fill(parts, cuisine, location, content):
+    head, middle, before_content, tail = parts
+    return ''.join((head, cuisine, middle, location, before_content, content, tail))
+
+
+@lru_cache(maxsize=32)
+def _table_header(columns):
+    """Returns the opening of the HTML table for the given columns."""
+    return "<table border='1'><tr>" + ''.join(f"<th>{escape(key.title())}</th>" for key in columns) + "</tr>"
+
+
+def _render_row(restaurant, columns):
+    """Returns the (HTML, plain-text) rendering of one restaurant's cells."""
+    cells = ['' if value is None else str(value) for value in map(restaurant.get, columns)]
+    # Cells are element content, where quotes need no escaping
+    return '<tr><td>' + '</td><td>'.join([escape(cell, False) for cell in cells]) + '</td></tr>', ' | '.join(cells)
+
+
+def _render_rows(restaurants, columns, row_cache=None, business_ids=None):
+    html_parts = [_table_header(columns)]
+    text_lines = []
+
+    for number, restaurant in enumerate(restaurants, 1):
+        if row_cache is None or business_ids is None:
+            html_row, text_row = _render_row(restaurant, columns)
+        else:
+            # Restaurants shared between recipients are only rendered once per batch
+            key = (business_ids[number - 1], columns)
+            rendered = row_cache.get(key)
+            if rendered is None:
+                rendered = row_cache[key] = _render_row(restaurant, columns)
+            html_row, text_row = rendered
+
+        html_parts.append(html_row)
+        text_lines.append(f"{number}. {text_row}")
+
+    html_parts.append('</table>')
+    return ''.join(html_parts), '\n'.join(text_lines)
+
+
+def render_suggestions(restaurants, cuisine_type, location, columns=EMAIL_COLUMNS, row_cache=None, business_ids=None):
+    """
+    Renders the restaurant suggestion email.
+
+    Only the columns present in at least one restaurant are shown. Every value
+    is HTML-escaped in the HTML part. A plain-text alternative is rendered
+    alongside it, and an empty list renders a short apology instead of a table.
+
+    Args:
+        restaurants (list): Restaurant dictionaries; only the given columns are shown.
+        cuisine_type (str): Type of cuisine for the suggestions.
+        location (str): Location for the suggestions.
+        columns (tuple): The restaurant fields to show, in order.
+        row_cache (dict): Rendered rows to reuse, shared within a batch.
+        business_ids (list): The IDs of the restaurants, in the same order,
+            which key the row cache. Rows are not cached without them.
+
+    Returns:
+        RenderedEmail: The subject, HTML body and plain-text body.
+    """
+    present = set().union(*restaurants)
+    columns = tuple(key for key in columns if key in present)
+    cuisine = (cuisine_type or '').title()
+    location = location or ''
+
+    if restaurants:
+        html_content, text_content = _render_rows(restaurants, columns, row_cache, business_ids)
+    else:
+        html_content = EMPTY_HTML
+        text_content = EMPTY_TEXT
+
+    return RenderedEmail(
+        SUBJECT,
+        _fill(_HTML_PARTS, escape(cuisine, False), escape(location, False), html_content),
+        _fill(_TEXT_PARTS, cuisine, location, text_content)
+    )
+
+
+@traced('render')
+def render_batch(recipients, columns=EMAIL_COLUMNS):
+    """
+    Renders the suggestion emails for a batch of recipients in one pass.
+
+    Table rows of restaurants suggested to several recipients are rendered
+    only once.
+
+    Args:
+        recipients (list): (restaurants, dining_details, business_ids)
+            tuples, where dining_details holds the 'Cuisine' and 'Location'
+            of the request and business_ids the restaurants' IDs in order.
+        columns (tuple): The restaurant fields to show, in order.
+
+    Returns:
+        list: A RenderedEmail per recipient, in the same order.
+    """
+    row_cache = {}
+    return [
+        render_suggestions(restaurants, dining_details['Cuisine'], dining_details.get('Location'), columns, row_cache,
+                           business_ids)
+        for restaurants, dining_details, business_ids in recipients
+    ]
@@ -0,0 +1,50 @@
+import re
+
+# Manhattan ZIP codes run from 10001 to 10282
+ZIP_CODE_PATTERN = re.compile(r'^10[0-2]\d\d$')
+
+# Approximate centers (latitude, longitude) of the Manhattan neighborhoods a
+# dining request can name instead of the whole borough
+NEIGHBORHOODS = {
+    'battery park city': (40.7115, -74.0160),
+    'chelsea': (40.7465, -74.0014),
+    'chinatown': (40.7158, -73.9970),
+    'east harlem': (40.7957, -73.9389),
+    'east village': (40.7265, -73.9815),
+    'financial district': (40.7075, -74.0113),
+    'flatiron': (40.7411, -73.9897),
+    'gramercy': (40.7368, -73.9845),
+    'greenwich village': (40.7336, -73.9990),
+    'harlem': (40.8116, -73.9465),
+    'hells kitchen': (40.7638, -73.9918),
+    'inwood': (40.8677, -73.9212),
+    'kips bay': (40.7420, -73.9780),
+    'little italy': (40.7191, -73.9973),
+    'lower east side': (40.7150, -73.9843),
+    'midtown': (40.7549, -73.9840),
+    'morningside heights': (40.8090, -73.9624),
+    'murray hill': (40.7479, -73.9757),
+    'noho': (40.7262, -73.9928),
+    'nolita': (40.7230, -73.9949),
+    'soho': (40.7233, -74.0030),
+    'tribeca': (40.7163, -74.0086),
+    'upper east side': (40.7736, -73.9566),
+    'upper west side': (40.7870, -73.9754),
+    'washington heights': (40.8417, -73.9394),
+    'west village': (40.7358, -74.0036),
+}
+
+
+def neighborhood_key(name):
+    """Normalizes a neighborhood name, so that "Hell's Kitchen" matches 'hells kitchen'."""
+    return ' '.join(re.findall(r'[a-z0-9]+', name.lower().replace("'", '')))
+
+
+def is_zip_code(location):
+    """Checks whether a location is a Manhattan ZIP code."""
+    return bool(ZIP_CODE_PATTERN.match(location.strip()))
+
+
+def neighborhood_center(location):
+    """Returns the (latitude, longitude) of a known neighborhood, or None."""
+    return NEIGHBORHOODS.get(neighborhood_key(location))
@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from aws_clients import get_resource
+from email_render import EMAIL_COLUMNS
+from tracing import traced
+
+logger = logging.getLogger()
+
+RESTAURANTS_TABLE = 'yelp-restaurants'
+
+# The only restaurant fields shown in the suggestion email
+DETAIL_FIELDS = list(EMAIL_COLUMNS)
+
+RESTAURANT_CACHE_MAX_ENTRIES = int(os.environ.get('RESTAURANT_CACHE_MAX_ENTRIES', 5000))
+RESTAURANT_CACHE_MAX_BYTES = int(os.environ.get('RESTAURANT_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+RESTAURANT_CACHE_TTL_SECONDS = int(os.environ.get('RESTAURANT_CACHE_TTL_SECONDS', 3600))
+
+# batch_get_item accepts at most 100 keys per request
+BATCH_GET_MAX_KEYS = 100
+BATCH_GET_MAX_RETRIES = 5
+BATCH_GET_BASE_DELAY = 0.05
+
+
+class RestaurantCache:
+    """
+    A thread-safe LRU cache of restaurant details with TTL expiry.
+
+    The cache is bounded both by the number of entries and by the approximate
+    size of the cached records.
+    """
+
+    def __init__(self, max_entries, max_bytes, ttl_seconds):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, business_id):
+        """Returns the cached record, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(business_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            record, size, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(business_id)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(business_id)
+            self.hits += 1
+            return record
+
+    def put(self, business_id, record):
+        """Caches a record, evicting the least recently used ones if needed."""
+        size = len(business_id) + len(json.dumps(record, default=str))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if business_id in self._entries:
+                self._remove(business_id)
+
+            self._entries[business_id] = (record, size, time.monotonic() + self.ttl_seconds)
+            self.size_bytes += size
+
+            while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, business_id):
+        _, size, _ = self._entries.pop(business_id)
+        self.size_bytes -= size
+
+    def stats(self):
+        """Returns the hit/miss counters and the current size of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'size_bytes': self.size_bytes,
+        }
+
+
+restaurant_cache = RestaurantCache(
+    RESTAURANT_CACHE_MAX_ENTRIES, RESTAURANT_CACHE_MAX_BYTES, RESTAURANT_CACHE_TTL_SECONDS
+)
+
+
+def batch_get_restaurants(business_ids):
+    """
+    Fetches the projected details of the given restaurants from DynamoDB.
+
+    Keys are requested in chunks of up to 100, and unprocessed keys are retried
+    with exponential backoff and jitter.
+
+    Args:
+        business_ids (list): The business IDs to fetch.
+
+    Returns:
+        dict: The fetched records keyed by business ID.
+
+    Raises:
+        RuntimeError: If some keys are still unprocessed after all retries.
+    """
+    dynamodb = get_resource('dynamodb')
+    names = {f"#f{index}": field for index, field in enumerate(['business_id'] + DETAIL_FIELDS)}
+    records = {}
+
+    for start in range(0, len(business_ids), BATCH_GET_MAX_KEYS):
+        request = {
+            RESTAURANTS_TABLE: {
+                'Keys': [{'business_id': business_id} for business_id in business_ids[start:start + BATCH_GET_MAX_KEYS]],
+                'ProjectionExpression': ', '.join(names),
+                'ExpressionAttributeNames': names,
+            }
+        }
+
+        for attempt in range(BATCH_GET_MAX_RETRIES + 1):
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response['Responses'].get(RESTAURANTS_TABLE, []):
+                records[item.pop('business_id')] = item
+
+            request = response.get('UnprocessedKeys')
+            if not request:
+                break
+
+            if attempt == BATCH_GET_MAX_RETRIES:
+                unprocessed = len(request[RESTAURANTS_TABLE]['Keys'])
+                raise RuntimeError(f"{unprocessed} restaurant keys still unprocessed after {attempt} retries")
+
+            delay = BATCH_GET_BASE_DELAY * 2 ** attempt
+            time.sleep(random.uniform(0, delay))
+
+    return records
+
+
+@traced('detail_fetch')
+def fetch_restaurants(business_ids):
+    """
+    Returns restaurant details for the given IDs, fetching only cache misses.
+
+    Args:
+        business_ids (list): The business IDs to look up.
+
+    Returns:
+        dict: The restaurant records keyed by business ID. IDs that do not
+            exist in the table, or were tombstoned by ingestion, are left out.
+    """
+    found = {}
+    misses = []
+    for business_id in dict.fromkeys(business_ids):
+        record = restaurant_cache.get(business_id)
+        if record is None:
+            misses.append(business_id)
+        else:
+            found[business_id] = record
+
+    if misses:
+        fetched = batch_get_restaurants(misses)
+        for business_id, record in fetched.items():
+            # A tombstone has no details (the projection leaves it empty); an
+            # artifact that predates it may still list the ID
+            if not record.get('name'):
+                continue
+            restaurant_cache.put(business_id, record)
+            found[business_id] = record
+
+    return found
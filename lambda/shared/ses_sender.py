@@ -0,0 +1,203 @@
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+
+from aws_clients import get_client
+from token_bucket import TokenBucket
+from tracing import traced
+
+logger = logging.getLogger()
+
+# Template whose parts are filled with the pre-rendered email of each recipient
+SES_TEMPLATE_NAME = os.environ.get('SES_TEMPLATE_NAME', 'FoodySuggestions')
+
+# Maximum emails per second; read from the account's send quota when unset
+SES_MAX_SEND_RATE = os.environ.get('SES_MAX_SEND_RATE')
+
+# send_bulk_templated_email accepts at most 50 destinations per call
+BULK_MAX_DESTINATIONS = 50
+SEND_MAX_ATTEMPTS = int(os.environ.get('SES_SEND_MAX_ATTEMPTS', 4))
+SEND_BASE_DELAY = 0.2
+
+# Per-destination statuses worth retrying; every other non-success is permanent
+RETRYABLE_STATUSES = {'AccountThrottled', 'TransientFailure', 'Failed'}
+THROTTLING_ERRORS = {'Throttling', 'ThrottlingException', 'TooManyRequestsException'}
+
+# Addresses that fail this are rejected before sending, since a bad one makes
+# SES (or botocore, when it is not a string) fail every destination of its call
+_ADDRESS = re.compile(r'[^@\s]+@[^@\s]+\.[^@\s]+')
+
+SendResult = namedtuple('SendResult', ['ok', 'status', 'message_id', 'error'])
+
+
+_bucket = None
+_template_ready = False
+_init_lock = threading.Lock()
+
+
+def _get_bucket():
+    global _bucket
+
+    if _bucket is None:
+        with _init_lock:
+            if _bucket is None:
+                rate = float(SES_MAX_SEND_RATE) if SES_MAX_SEND_RATE else get_client('ses').get_send_quota()['MaxSendRate']
+                _bucket = TokenBucket(rate)
+                logger.info(f"SES send rate limited to {rate} emails per second")
+    return _bucket
+
+
+def ensure_template():
+    """Creates the pass-through SES template on first use if it does not exist yet."""
+    global _template_ready
+
+    if _template_ready:
+        return
+
+    with _init_lock:
+        if _template_ready:
+            return
+
+        from botocore.exceptions import ClientError
+
+        ses = get_client('ses')
+        try:
+            ses.get_template(TemplateName=SES_TEMPLATE_NAME)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TemplateDoesNotExist':
+                raise
+            ses.create_template(Template={
+                'TemplateName': SES_TEMPLATE_NAME,
+                'SubjectPart': '{{subject}}',
+                'HtmlPart': '{{{html}}}',
+                'TextPart': '{{{text}}}',
+            })
+            logger.info(f"Created SES template {SES_TEMPLATE_NAME}")
+
+        _template_ready = True
+
+
+def _backoff(attempt):
+    time.sleep(random.uniform(0, SEND_BASE_DELAY * 2 ** attempt))
+
+
+def _send_chunk(ses, sender, chunk):
+    """Sends one bulk call and returns a SendResult per key."""
+    response = ses.send_bulk_templated_email(
+        Source=sender,
+        Template=SES_TEMPLATE_NAME,
+        DefaultTemplateData=json.dumps({'subject': '', 'html': '', 'text': ''}),
+        Destinations=[
+            {
+                'Destination': {'ToAddresses': [recipient]},
+                'ReplacementTemplateData': json.dumps({'subject': email.subject, 'html': email.html, 'text': email.text}),
+            }
+            for _, recipient, email in chunk
+        ]
+    )
+
+    results = {}
+    for (key, _, _), status in zip(chunk, response['Status']):
+        results[key] = SendResult(
+            status['Status'] == 'Success', status['Status'], status.get('MessageId'), status.get('Error')
+        )
+    return results
+
+
+@traced('ses')
+def send_bulk_email(emails, sender=None, deadline=None):
+    """
+    Sends pre-rendered emails through send_bulk_templated_email.
+
+    Recipients are grouped into calls of up to 50 destinations, or fewer when
+    the account's send rate is lower. Every email takes a token from a bucket
+    sized to the account's send rate. Throttled calls and retryable
+    per-destination failures are retried with backoff; whatever still fails is
+    reported so that the caller can retry it later. Malformed addresses are
+    reported as failed without being sent, so they cannot fail their call.
+
+    Args:
+        emails (list): (key, recipient address, RenderedEmail) tuples.
+        sender (str): The source address. Defaults to SENDER_EMAIL.
+        deadline (float): A time.monotonic() value after which no retry is started.
+
+    Returns:
+        dict: A SendResult per key.
+    """
+    if not emails:
+        return {}
+
+    from botocore.exceptions import ClientError
+
+    ses = get_client('ses')
+    sender = sender or os.environ.get('SENDER_EMAIL')
+    ensure_template()
+    bucket = _get_bucket()
+
+    results = {}
+    pending = []
+    for item in emails:
+        recipient = item[1]
+        if isinstance(recipient, str) and _ADDRESS.fullmatch(recipient):
+            pending.append(item)
+        else:
+            results[item[0]] = SendResult(False, 'InvalidAddress', None, f"Invalid recipient address: {recipient!r}")
+
+    # A call never sends more emails than the account may send per second
+    chunk_size = max(1, min(BULK_MAX_DESTINATIONS, int(bucket.capacity)))
+
+    for attempt in range(SEND_MAX_ATTEMPTS):
+        retry = []
+
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            bucket.acquire(len(chunk))
+
+            try:
+                chunk_results = _send_chunk(ses, sender, chunk)
+            except ClientError as e:
+                code = e.response['Error']['Code']
+                error_result = SendResult(False, code, None, str(e))
+                for key, _, _ in chunk:
+                    results[key] = error_result
+                if code in THROTTLING_ERRORS:
+                    retry.extend(chunk)
+                else:
+                    logger.error(f"Bulk send failed: {e}")
+                continue
+            except Exception as e:
+                # Connection errors and timeouts only fail this chunk. They are
+                # not retried here since a timed-out call may have been sent;
+                # SQS redelivers the messages instead.
+                logger.error(f"Bulk send failed: {e!r}")
+                error_result = SendResult(False, type(e).__name__, None, str(e))
+                for key, _, _ in chunk:
+                    results[key] = error_result
+                continue
+
+            for item in chunk:
+                result = chunk_results[item[0]]
+                results[item[0]] = result
+                if not result.ok and result.status in RETRYABLE_STATUSES:
+                    retry.append(item)
+
+        if not retry:
+            break
+        if attempt + 1 == SEND_MAX_ATTEMPTS or (deadline is not None and time.monotonic() >= deadline):
+            break
+
+        logger.warning(f"Retrying {len(retry)} throttled or failed emails")
+        _backoff(attempt)
+        pending = retry
+
+    failed = {key: result for key, result in results.items() if not result.ok}
+    if failed:
+        logger.error(f"Failed to send {len(failed)} of {len(emails)} emails: {failed}")
+    logger.info(f"Sent {len(emails) - len(failed)} emails")
+
+    return results
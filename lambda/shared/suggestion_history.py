@@ -0,0 +1,83 @@
+import json
+import os
+import zlib
+
+# 'compact' stores references to the suggested restaurants; 'full' keeps
+# writing whole records, for as long as an LF1 that cannot read compact items
+# is still deployed
+HISTORY_FORMAT = os.environ.get('HISTORY_FORMAT', 'compact')
+
+# Compact items can pack their business IDs into a zlib-compressed binary
+# attribute, which pays off when many suggestions are stored per user
+HISTORY_COMPRESSION = os.environ.get('HISTORY_COMPRESSION', 'none')
+
+COMPACT_FORMAT_VERSION = 2
+
+# The request fields needed to send the suggestions again; 'Cuisine' and
+# 'Location' are also what a greeting reads back
+HISTORY_FIELDS = ['Cuisine', 'Location', 'Email']
+
+
+def encode_history(user_id, business_ids, restaurants, dining_details, catalog_version=None, seen_filter=None):
+    """
+    Builds the past-restaurant-suggestions item of a user.
+
+    A compact item keeps only the business IDs, the catalog version they were
+    drawn from and the HISTORY_FIELDS of the request, under the same
+    'dining_details' attribute as before.
+
+    Args:
+        user_id (str): The Lex session ID the suggestions are stored under.
+        business_ids (list): The IDs of the suggested restaurants.
+        restaurants (list): The suggested restaurant records, in the same order.
+        dining_details (dict): The request the suggestions were made for.
+        catalog_version (str): The version of the restaurant catalog, if known.
+        seen_filter (bytes): The user's encoded seen-restaurant filter, if any.
+            It is kept in both formats.
+
+    Returns:
+        dict: The item to put.
+    """
+    if HISTORY_FORMAT == 'full':
+        item = {'user_id': user_id, 'dining_details': dining_details, 'restaurants': restaurants}
+        if seen_filter is not None:
+            item['seen_filter'] = seen_filter
+        return item
+
+    item = {
+        'user_id': user_id,
+        'format': COMPACT_FORMAT_VERSION,
+        'dining_details': {field: dining_details[field] for field in HISTORY_FIELDS if dining_details.get(field) is not None},
+    }
+    if catalog_version:
+        item['catalog_version'] = catalog_version
+    if seen_filter is not None:
+        item['seen_filter'] = seen_filter
+
+    if HISTORY_COMPRESSION == 'zlib':
+        item['packed_ids'] = zlib.compress(json.dumps(list(business_ids), separators=(',', ':')).encode('utf-8'))
+    else:
+        item['business_ids'] = list(business_ids)
+    return item
+
+
+def is_compact(item):
+    """Checks whether an item was written in the compact format."""
+    return item.get('format') == COMPACT_FORMAT_VERSION
+
+
+def history_business_ids(item):
+    """
+    Returns the business IDs of a compact item, in the order they were suggested.
+
+    Args:
+        item (dict): The item as read from DynamoDB.
+
+    Returns:
+        list: The business IDs.
+    """
+    packed = item.get('packed_ids')
+    if packed is not None:
+        # boto3 wraps binary attributes in a Binary object
+        return json.loads(zlib.decompress(bytes(getattr(packed, 'value', packed))))
+    return list(item.get('business_ids', []))
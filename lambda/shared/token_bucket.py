@@ -0,0 +1,35 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket.
+
+    Args:
+        rate (float): Tokens added per second.
+        capacity (float): The maximum number of tokens that can accumulate.
+            Defaults to one second's worth, and at least one token.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Blocks until the requested number of tokens is available and takes them."""
+        if tokens > self.capacity:
+            raise ValueError(f"Cannot take {tokens} tokens from a bucket of {self.capacity}")
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
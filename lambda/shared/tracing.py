@@ -0,0 +1,184 @@
+import functools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger()
+
+# Handlers set the root logger to this level; DEBUG turns on payload logging
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+
+# Share of payloads logged when DEBUG is enabled, and their maximum length
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get('LOG_PAYLOAD_SAMPLE_RATE', 0.1))
+LOG_PAYLOAD_MAX_CHARS = int(os.environ.get('LOG_PAYLOAD_MAX_CHARS', 4096))
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'DiningConcierge')
+
+# EMF accepts at most 100 values per metric in one record
+EMF_MAX_VALUES = 100
+
+
+class Metrics:
+    """
+    Collects stage durations and counters during one invocation.
+
+    Durations are emitted per stage as arrays of values, so that CloudWatch
+    can compute percentiles over every call of the stage, not just the total.
+    """
+
+    def __init__(self):
+        self._durations = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def add_duration(self, stage_name, milliseconds, failed=False):
+        with self._lock:
+            durations, errors = self._durations.get(stage_name, ([], 0))
+            durations.append(round(milliseconds, 3))
+            self._durations[stage_name] = (durations, errors + int(failed))
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + value
+
+    def drain(self):
+        """
+        Returns the collected metrics and starts over.
+
+        Returns:
+            tuple: ({stage: (durations in ms, error count)}, {counter: value}).
+        """
+        with self._lock:
+            durations, self._durations = self._durations, {}
+            counts, self._counts = self._counts, {}
+        return durations, counts
+
+    def flush(self, function_name, stream=None):
+        """Writes the collected metrics as EMF records and starts over."""
+        durations, counts = self.drain()
+
+        if not METRICS_ENABLED:
+            return
+
+        stream = stream or sys.stdout
+        timestamp = int(time.time() * 1000)
+
+        for stage_name, (values, errors) in durations.items():
+            for start in range(0, len(values), EMF_MAX_VALUES):
+                stream.write(json.dumps({
+                    '_aws': {
+                        'Timestamp': timestamp,
+                        'CloudWatchMetrics': [{
+                            'Namespace': METRICS_NAMESPACE,
+                            'Dimensions': [['Function', 'Stage']],
+                            'Metrics': [{'Name': 'Duration', 'Unit': 'Milliseconds'},
+                                        {'Name': 'Errors', 'Unit': 'Count'}]
+                        }]
+                    },
+                    'Function': function_name,
+                    'Stage': stage_name,
+                    'Duration': values[start:start + EMF_MAX_VALUES],
+                    'Errors': errors if start == 0 else 0
+                }) + '\n')
+
+        if counts:
+            stream.write(json.dumps({
+                '_aws': {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': METRICS_NAMESPACE,
+                        'Dimensions': [['Function']],
+                        'Metrics': [{'Name': name, 'Unit': 'Count'} for name in counts]
+                    }]
+                },
+                'Function': function_name,
+                **counts
+            }) + '\n')
+        stream.flush()
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def stage(name):
+    """
+    Times a block of code as one call of a stage.
+
+    Args:
+        name (str): The stage name, e.g. 'search' or 'ses'.
+    """
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        metrics.add_duration(name, (time.perf_counter() - started) * 1000, failed)
+
+
+def traced(name):
+    """Decorator that times every call of the function as the given stage."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1):
+    """Adds to a counter emitted with the invocation's metrics."""
+    metrics.count(name, value)
+
+
+def traced_handler(function_name):
+    """
+    Decorator for a Lambda handler that times it and flushes the metrics.
+
+    Args:
+        function_name (str): The Function dimension, unless the Lambda
+            runtime provides the deployed function name.
+    """
+    function_name = os.environ.get('AWS_LAMBDA_FUNCTION_NAME', function_name)
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            try:
+                with stage('handler'):
+                    return handler(event, context)
+            finally:
+                metrics.flush(function_name)
+        return wrapper
+    return decorator
+
+
+def log_payload(label, payload, level=logging.DEBUG):
+    """
+    Logs a request or response body, lazily and sampled.
+
+    Nothing is serialized unless the level is enabled and the payload is
+    picked by LOG_PAYLOAD_SAMPLE_RATE; long bodies are truncated.
+
+    Args:
+        label (str): What the payload is, e.g. 'Event'.
+        payload: Any JSON-serializable object.
+        level (int): The logging level to log at.
+    """
+    if not logger.isEnabledFor(level) or random.random() >= LOG_PAYLOAD_SAMPLE_RATE:
+        return
+
+    body = json.dumps(payload, default=str)
+    if len(body) > LOG_PAYLOAD_MAX_CHARS:
+        body = f"{body[:LOG_PAYLOAD_MAX_CHARS]}... ({len(body)} chars)"
+    logger.log(level, f"{label}: {body}")
@@ -0,0 +1,516 @@
+"""
+Restaurant catalog ingestion: Yelp -> DynamoDB (yelp-restaurants) and OpenSearch.
+
+This is the production version of the loop in Utils.ipynb. Yelp result pages are
+fetched concurrently under a shared rate limit, DynamoDB is written through
+batch_writer and OpenSearch through the _bulk API.
+
+Usage:
+    python ingest.py --cuisines Italian Thai --location Manhattan
+    python ingest.py --incremental manifest.json
+
+Credentials are read from YELP_API_KEY, ES_HOST, ES_USERNAME and ES_PASSWORD.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import requests
+
+# LF2 owns the artifact formats it loads; they use the modules shared by every handler
+sys.path[:0] = [os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda', directory)
+                for directory in ('LF2 Worker', 'shared')]
+
+from token_bucket import TokenBucket  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+CUISINES = ['Italian', 'Indian', 'French', 'Chinese', 'Mexican', 'Thai', 'Japanese']
+
+YELP_SEARCH_URL = "https://api.yelp.com/v3/businesses/search"
+
+# Yelp returns at most 50 businesses per page and 1000 per search
+YELP_PAGE_SIZE = 50
+YELP_MAX_RESULTS = 1000
+
+OPENSEARCH_INDEX = 'restaurants'
+
+
+class YelpClient:
+    """Fetches pages of the Yelp business search over a pooled HTTP session."""
+
+    def __init__(self, api_key, rate_limiter, session=None):
+        self.rate_limiter = rate_limiter
+        self.session = session or requests.Session()
+        self.session.headers['Authorization'] = f"Bearer {api_key}"
+
+    def search(self, cuisine, location, offset, limit=YELP_PAGE_SIZE):
+        """
+        Returns one page of the business search.
+
+        Returns:
+            dict: The decoded response with 'businesses' and 'total'.
+        """
+        self.rate_limiter.acquire()
+        response = self.session.get(
+            YELP_SEARCH_URL,
+            params={'term': cuisine, 'location': location, 'limit': limit, 'offset': offset},
+            timeout=10
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+class OpenSearchBulkIndexer:
+    """Indexes restaurant documents through the OpenSearch _bulk API."""
+
+    def __init__(self, endpoint, auth, index=OPENSEARCH_INDEX, session=None):
+        self.endpoint = endpoint.rstrip('/')
+        self.auth = auth
+        self.index = index
+        self.session = session or requests.Session()
+
+    def bulk(self, actions):
+        """
+        Sends one _bulk request.
+
+        Args:
+            actions (list): (action, document ID, source) tuples where action is
+                'index' or 'delete' and source is None for deletes.
+
+        Returns:
+            set: The document IDs whose actions failed.
+        """
+        lines = []
+        for action, doc_id, source in actions:
+            lines.append(json.dumps({action: {'_index': self.index, '_id': doc_id}}))
+            if source is not None:
+                lines.append(json.dumps(source))
+
+        response = self.session.post(
+            f"{self.endpoint}/_bulk",
+            data='\n'.join(lines) + '\n',
+            headers={'Content-Type': 'application/x-ndjson'},
+            auth=self.auth,
+            timeout=30
+        )
+        response.raise_for_status()
+        result = response.json()
+
+        if not result.get('errors'):
+            return set()
+
+        failed = [item for item in result['items'] if next(iter(item.values())).get('error')]
+        for item in failed[:5]:
+            logger.error(f"Bulk action failed: {item}")
+        return {next(iter(item.values()))['_id'] for item in failed}
+
+
+class IngestionStats:
+    """Counters reported at the end of an ingestion run."""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.pages = 0
+        self.fetched = 0
+        self.written = 0
+        self.indexed = 0
+        self.index_errors = 0
+        self.page_errors = 0
+        self.unchanged = 0
+        self.tombstoned = 0
+
+    def report(self):
+        elapsed = time.monotonic() - self.started_at
+        return {
+            'pages': self.pages,
+            'page_errors': self.page_errors,
+            'fetched': self.fetched,
+            'written': self.written,
+            'unchanged': self.unchanged,
+            'tombstoned': self.tombstoned,
+            'indexed': self.indexed,
+            'index_errors': self.index_errors,
+            'elapsed_seconds': round(elapsed, 2),
+            'restaurants_per_second': round(self.fetched / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+def to_dynamodb_item(restaurant):
+    """Converts a Yelp business into a yelp-restaurants item."""
+    return {
+        "business_id": restaurant["id"],
+        "name": restaurant["name"],
+        "address": ", ".join(restaurant["location"]["display_address"]),
+        "coordinates": {
+            "latitude": Decimal(str(restaurant["coordinates"]["latitude"])),
+            "longitude": Decimal(str(restaurant["coordinates"]["longitude"]))
+        },
+        "review_count": restaurant["review_count"],
+        "rating": Decimal(str(restaurant["rating"])),
+        "zip_code": restaurant["location"]["zip_code"],
+        "insertedAtTimestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def to_opensearch_document(restaurant):
+    """Converts a Yelp business into the document LF2 searches by cuisine."""
+    return {
+        "RestaurantID": restaurant["id"],
+        "Cuisine": restaurant["categories"][0]["title"]
+    }
+
+
+def fetch_pages(yelp, cuisines, location, concurrency, max_results=YELP_MAX_RESULTS, stats=None):
+    """
+    Fetches every result page for the cuisines concurrently.
+
+    The first page of each cuisine is fetched to learn the total, then the
+    remaining offsets are fetched in parallel. Pages are yielded as they arrive.
+
+    Args:
+        yelp (YelpClient): The Yelp client.
+        cuisines (list): The cuisines to fetch.
+        location (str): The location to search in.
+        concurrency (int): The number of pages fetched in parallel.
+        max_results (int): The maximum number of results per cuisine.
+        stats (IngestionStats): Counters to update.
+
+    Yields:
+        tuple: (cuisine, list of Yelp businesses, number of pages of the cuisine
+            still outstanding) for every page.
+    """
+    stats = stats or IngestionStats()
+    outstanding = {cuisine: 1 for cuisine in cuisines}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(yelp.search, cuisine, location, 0, min(YELP_PAGE_SIZE, max_results)): (cuisine, 0)
+            for cuisine in cuisines
+        }
+
+        while futures:
+            future = next(as_completed(futures))
+            cuisine, offset = futures.pop(future)
+
+            if outstanding[cuisine] is not None:
+                outstanding[cuisine] -= 1
+
+            try:
+                page = future.result()
+            except Exception as e:
+                logger.error(f"Failed to fetch {cuisine} offset {offset}: {e}")
+                stats.page_errors += 1
+                # The cuisine is never reported as complete
+                outstanding[cuisine] = None
+                continue
+
+            stats.pages += 1
+            stats.fetched += len(page['businesses'])
+
+            if offset == 0:
+                total = min(page.get('total', 0), max_results)
+                for next_offset in range(YELP_PAGE_SIZE, total, YELP_PAGE_SIZE):
+                    limit = min(YELP_PAGE_SIZE, total - next_offset)
+                    futures[executor.submit(yelp.search, cuisine, location, next_offset, limit)] = (cuisine, next_offset)
+                    if outstanding[cuisine] is not None:
+                        outstanding[cuisine] += 1
+
+            yield cuisine, page['businesses'], outstanding[cuisine]
+
+
+class Manifest:
+    """
+    The local state of an incremental refresh.
+
+    It keeps a content hash per business_id, so unchanged restaurants are not
+    written again, along with the cuisines that return the restaurant, so it is
+    only tombstoned once none of them does. A checkpoint of the current run
+    lets an interrupted run resume after the last cuisine it completed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = {}
+        self.checkpoint = None
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.records = state.get('records', {})
+            self.checkpoint = state.get('checkpoint')
+
+        for record in self.records.values():
+            # Manifests written before records kept every cuisine
+            if 'cuisines' not in record:
+                record['cuisines'] = [record.pop('cuisine')] if 'cuisine' in record else []
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'records': self.records, 'checkpoint': self.checkpoint}, f)
+        os.replace(tmp_path, self.path)
+
+    def start_run(self, cuisines, location):
+        """Returns the checkpoint to continue, starting a new one if the last run finished."""
+        checkpoint = self.checkpoint
+        if (
+            not checkpoint
+            or checkpoint['location'] != location
+            or set(checkpoint['cuisines']) != set(cuisines)
+            # Older checkpoints did not record the cuisines a restaurant was seen in
+            or not isinstance(checkpoint['seen'], dict)
+        ):
+            checkpoint = {'location': location, 'cuisines': list(cuisines), 'completed': [], 'seen': {}}
+        self.checkpoint = checkpoint
+        return checkpoint
+
+    def is_current(self, business_id, content_hash):
+        record = self.records.get(business_id)
+        return record is not None and record['hash'] == content_hash
+
+
+def content_hash(restaurant):
+    """Hashes what ingestion writes for a restaurant, ignoring the insertion timestamp."""
+    item = to_dynamodb_item(restaurant)
+    del item['insertedAtTimestamp']
+    payload = json.dumps([item, to_opensearch_document(restaurant)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def ingest(yelp, table, indexer, cuisines, location, concurrency=8, bulk_size=500,
+           max_results=YELP_MAX_RESULTS, manifest=None):
+    """
+    Fetches restaurants from Yelp and stores them in DynamoDB and OpenSearch.
+
+    Writes are flushed in chunks of bulk_size: each chunk goes through one
+    DynamoDB batch_writer and one OpenSearch _bulk request.
+
+    With a manifest the run is incremental: only new or changed restaurants are
+    written, restaurants that are no longer returned for the run's cuisines are
+    tombstoned, and progress is checkpointed after every flush so an
+    interrupted run resumes after the last completed cuisine without rewriting
+    what it already stored.
+
+    Args:
+        yelp (YelpClient): The Yelp client.
+        table: The yelp-restaurants DynamoDB Table (anything with batch_writer).
+        indexer (OpenSearchBulkIndexer): The OpenSearch indexer.
+        cuisines (list): The cuisines to fetch.
+        location (str): The location to search in.
+        concurrency (int): The number of Yelp pages fetched in parallel.
+        bulk_size (int): The number of documents per _bulk request.
+        max_results (int): The maximum number of results per cuisine.
+        manifest (Manifest): The incremental refresh state, or None to write everything.
+
+    Returns:
+        tuple: (IngestionStats, dict of Yelp businesses keyed by (cuisine, location)).
+    """
+    stats = IngestionStats()
+    fetched = {}
+    pending = {}
+
+    checkpoint = manifest.start_run(cuisines, location) if manifest else None
+    if checkpoint and checkpoint['completed']:
+        logger.info(f"Resuming after {checkpoint['completed']}")
+    # The cuisines each restaurant was returned for in this run
+    seen = {business_id: set(seen_in) for business_id, seen_in in checkpoint['seen'].items()} if checkpoint else {}
+
+    def save_checkpoint():
+        checkpoint['seen'] = {business_id: sorted(seen_in) for business_id, seen_in in seen.items()}
+        manifest.save()
+
+    def flush():
+        if not pending:
+            return
+
+        with table.batch_writer(overwrite_by_pkeys=['business_id']) as writer:
+            for restaurant, _, _ in pending.values():
+                writer.put_item(Item=to_dynamodb_item(restaurant))
+        stats.written += len(pending)
+
+        failed = indexer.bulk([
+            ('index', business_id, to_opensearch_document(restaurant))
+            for business_id, (restaurant, _, _) in pending.items()
+        ])
+        stats.index_errors += len(failed)
+        stats.indexed += len(pending) - len(failed)
+
+        if manifest:
+            # Restaurants that failed to index keep their old record, so the
+            # next run sees them as changed and indexes them again. New ones
+            # get an empty hash, which never matches but can be tombstoned.
+            for business_id, (_, cuisine, digest) in pending.items():
+                record = manifest.records.get(business_id)
+                record_cuisines = sorted(set(record['cuisines'] if record else ()) | {cuisine})
+                if business_id not in failed:
+                    manifest.records[business_id] = {'hash': digest, 'cuisines': record_cuisines}
+                elif record is None:
+                    manifest.records[business_id] = {'hash': '', 'cuisines': record_cuisines}
+            save_checkpoint()
+
+        pending.clear()
+
+    todo = [cuisine for cuisine in cuisines if not checkpoint or cuisine not in checkpoint['completed']]
+
+    for cuisine, businesses, pages_left in fetch_pages(yelp, todo, location, concurrency, max_results, stats):
+        fetched.setdefault((cuisine, location), []).extend(businesses)
+
+        for restaurant in businesses:
+            seen.setdefault(restaurant['id'], set()).add(cuisine)
+            digest = content_hash(restaurant) if manifest else None
+            if manifest and manifest.is_current(restaurant['id'], digest):
+                stats.unchanged += 1
+                continue
+
+            pending[restaurant['id']] = (restaurant, cuisine, digest)
+            if len(pending) >= bulk_size:
+                flush()
+
+        if pages_left == 0:
+            # Everything fetched for the cuisine has to be stored before it counts as completed
+            flush()
+            if checkpoint:
+                checkpoint['completed'].append(cuisine)
+                save_checkpoint()
+            logger.info(f"{cuisine}: {len(fetched.get((cuisine, location), []))} restaurants")
+
+    flush()
+
+    if manifest:
+        if stats.page_errors:
+            # Missing pages would look like removed restaurants; keep the checkpoint to resume
+            logger.warning("Skipping tombstones because some pages failed")
+        else:
+            tombstone(table, indexer, manifest, set(cuisines), seen, bulk_size, stats)
+            manifest.checkpoint = None
+            manifest.save()
+
+    return stats, fetched
+
+
+def tombstone(table, indexer, manifest, cuisines, seen, bulk_size, stats):
+    """
+    Marks restaurants that no cuisine returns any more as deleted.
+
+    Every restaurant of the refreshed cuisines was seen in the run, so a
+    restaurant's refreshed cuisines are replaced by those it was seen in. Its
+    cuisines outside the run are kept, and it is only tombstoned once none is
+    left. The DynamoDB item is replaced by a tombstone and the OpenSearch
+    document is deleted, so LF2 stops suggesting the restaurant.
+
+    Args:
+        seen (dict): The set of cuisines each restaurant was returned for in the run.
+    """
+    gone = []
+    for business_id, record in manifest.records.items():
+        if record['hash'] is None or not cuisines.intersection(record['cuisines']):
+            continue
+        remaining = (set(record['cuisines']) - cuisines) | seen.get(business_id, set())
+        if remaining:
+            record['cuisines'] = sorted(remaining)
+        else:
+            gone.append(business_id)
+    manifest.save()
+
+    for start in range(0, len(gone), bulk_size):
+        chunk = gone[start:start + bulk_size]
+        deleted_at = datetime.now(timezone.utc).isoformat()
+
+        with table.batch_writer(overwrite_by_pkeys=['business_id']) as writer:
+            for business_id in chunk:
+                writer.put_item(Item={'business_id': business_id, 'deleted': True, 'deletedAtTimestamp': deleted_at})
+
+        failed = indexer.bulk([('delete', business_id, None) for business_id in chunk])
+        stats.index_errors += len(failed)
+
+        # A failed delete is tried again by the next run
+        for business_id in chunk:
+            if business_id not in failed:
+                manifest.records[business_id]['hash'] = None
+        manifest.save()
+        stats.tombstoned += len(chunk) - len(failed)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cuisines', nargs='+', default=CUISINES)
+    parser.add_argument('--location', default='Manhattan')
+    parser.add_argument('--concurrency', type=int, default=8, help='Yelp pages fetched in parallel')
+    parser.add_argument('--rate', type=float, default=5.0, help='Yelp requests per second')
+    parser.add_argument('--bulk-size', type=int, default=500, help='Documents per OpenSearch _bulk request')
+    parser.add_argument('--max-results', type=int, default=YELP_MAX_RESULTS, help='Results per cuisine')
+    parser.add_argument('--table', default='yelp-restaurants')
+    parser.add_argument('--region', default='us-east-1')
+    parser.add_argument('--cuisine-index', help='Also write the LF2 cuisine index snapshot to this path')
+    parser.add_argument('--candidate-pools', help='Also write the LF2 candidate pool artifact to this path')
+    parser.add_argument('--geo-index', help='Also write the LF2 geo index snapshot to this path')
+    parser.add_argument('--incremental', metavar='MANIFEST',
+                        help='Only write new or changed restaurants, tombstone removed ones and '
+                             'checkpoint progress in this manifest file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    import boto3
+
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    yelp = YelpClient(os.environ['YELP_API_KEY'], TokenBucket(args.rate, capacity=args.concurrency))
+    table = boto3.resource('dynamodb', region_name=args.region).Table(args.table)
+    indexer = OpenSearchBulkIndexer(os.environ['ES_HOST'], (os.environ['ES_USERNAME'], os.environ['ES_PASSWORD']))
+
+    manifest = Manifest(args.incremental) if args.incremental else None
+    stats, fetched = ingest(yelp, table, indexer, args.cuisines, args.location, args.concurrency,
+                            args.bulk_size, args.max_results, manifest)
+
+    if (args.cuisine_index or args.candidate_pools or args.geo_index) and len(fetched) < len(args.cuisines):
+        # A resumed run does not refetch the cuisines completed before the interruption
+        logger.warning("Not every cuisine was fetched in this run; skipping artifact export")
+        args.cuisine_index = args.candidate_pools = args.geo_index = None
+
+    if args.cuisine_index:
+        from cuisine_index import write_snapshot
+
+        write_snapshot(
+            ((restaurant['categories'][0]['title'], restaurant['id'])
+             for businesses in fetched.values() for restaurant in businesses),
+            args.cuisine_index
+        )
+
+    if args.candidate_pools:
+        from candidate_pools import write_candidate_pools
+
+        write_candidate_pools(
+            {preference: [to_dynamodb_item(restaurant) for restaurant in businesses]
+             for preference, businesses in fetched.items()},
+            args.candidate_pools
+        )
+
+    if args.geo_index:
+        from geo_index import write_geo_index
+
+        write_geo_index(
+            ((restaurant['categories'][0]['title'], restaurant['id'],
+              restaurant['coordinates'].get('latitude'), restaurant['coordinates'].get('longitude'),
+              restaurant['location'].get('zip_code'))
+             for businesses in fetched.values() for restaurant in businesses),
+            args.geo_index
+        )
+
+    print(json.dumps(stats.report()))
+    return 0 if not (stats.page_errors or stats.index_errors) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())